@@ -0,0 +1,398 @@
+"""Local stand-ins for the Pexels API with its images CDN and for the Supervisely API,
+which allow to run the app pipeline offline in the benchmarks.
+
+The fake Pexels server runs in a separate process, so its CPU time and memory are not
+counted for the app. It serves the search pages with the same structure as the real API,
+the X-Ratelimit-* headers and the images, with configurable latency and error rate,
+and can return HTML pages instead of some images to imitate broken CDN responses.
+The fake Supervisely API is used in the app process instead of sly.Api and counts
+the calls of each method.
+"""
+
+import io
+import json
+import multiprocessing
+import random
+import threading
+import time
+import zlib
+
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import requests
+from PIL import Image
+
+IMAGE_SIZES = ["original", "large2x", "large", "medium", "small", "tiny"]
+# Number of different images served by the CDN, the photos reuse them by IDs.
+IMAGES_POOL_SIZE = 64
+RATE_LIMIT = 20000
+# Page which is served instead of the image for the corrupted responses, it's larger
+# than the minimum file size, so only the content check can reject it.
+ERROR_PAGE = b"<html><body>Service temporarily unavailable</body></html>".ljust(
+    4096, b" "
+)
+
+
+def make_images(size: int, number: int = IMAGES_POOL_SIZE) -> List[bytes]:
+    """Generates the pool of different JPEG images padded to the specified size.
+
+    Args:
+        size (int): size of each image in bytes
+        number (int): number of images
+
+    Returns:
+        List[bytes]: contents of the images
+    """
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(number):
+        pixels = rng.integers(0, 256, (32, 32, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).resize((256, 256)).save(buffer, format="JPEG")
+        content = buffer.getvalue()
+        # Decoders ignore the data after the end of the image, so it's used as padding.
+        images.append(content + bytes(max(size - len(content), 0)))
+    return images
+
+
+class FakePexelsHandler(BaseHTTPRequestHandler):
+    """Handler of the search requests, the image requests and the statistics requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/v1/search":
+            self.search(parse_qs(url.query))
+        elif url.path.startswith("/photos/"):
+            self.photo(int(url.path.split("/")[2]))
+        elif url.path == "/stats":
+            with self.server.lock:
+                self.reply(200, json.dumps(self.server.stats).encode())
+        else:
+            self.reply(404, b"")
+
+    def search(self, query: Dict[str, List[str]]):
+        options = self.server.options
+        time.sleep(options["latency"])
+        with self.server.lock:
+            self.server.stats["search_requests"] += 1
+            remaining = max(RATE_LIMIT - self.server.stats["search_requests"], 0)
+        headers = {
+            "X-Ratelimit-Limit": str(RATE_LIMIT),
+            "X-Ratelimit-Remaining": str(remaining),
+            "X-Ratelimit-Reset": str(int(time.time()) + 3600),
+        }
+        if self.server.random.random() < options["error_rate"]:
+            self.reply(503, b"Service Unavailable", headers)
+            return
+
+        params = {key: values[0] for key, values in query.items()}
+        page = int(params.pop("page", 1))
+        per_page = int(params.pop("per_page", 15))
+        search_query = params.pop("query", "")
+        total_results = options["total_results"]
+
+        # Photo IDs are stable for the same query and filters, so pages don't overlap,
+        # but different filters of the same query return partially the same photos.
+        universe = total_results * 2
+        query_base = zlib.crc32(search_query.encode()) % 1000 * 10**6
+        shift = zlib.crc32(json.dumps(params, sort_keys=True).encode()) % universe
+        first = (page - 1) * per_page
+        last = min(first + per_page, min(total_results, 8000))
+        photos = [
+            self.make_photo(query_base + (shift + number) % universe + 1)
+            for number in range(first, last)
+        ]
+        data = {
+            "page": page,
+            "per_page": per_page,
+            "total_results": min(total_results, 8000),
+            "photos": photos,
+        }
+        headers["Content-Type"] = "application/json"
+        self.reply(200, json.dumps(data).encode(), headers)
+
+    def make_photo(self, photo_id: int) -> Dict:
+        host = f"http://{self.headers['Host']}"
+        link = f"{host}/photos/{photo_id}/pexels-photo-{photo_id}.jpeg"
+        return {
+            "id": photo_id,
+            "width": 4000,
+            "height": 3000,
+            "url": f"https://www.pexels.com/photo/{photo_id}/",
+            "photographer": "Fake Photographer",
+            "photographer_url": "https://www.pexels.com/@fake",
+            "photographer_id": 1,
+            "avg_color": "#808080",
+            "alt": f"Fake photo {photo_id}",
+            "src": {
+                size: link if size == "original" else f"{link}?auto=compress&cs=tinysrgb"
+                for size in IMAGE_SIZES
+            },
+        }
+
+    def photo(self, photo_id: int):
+        options = self.server.options
+        time.sleep(options["cdn_latency"])
+        if self.server.random.random() < options["error_rate"]:
+            self.reply(500, b"Internal Server Error")
+            return
+        content = self.server.images[photo_id % len(self.server.images)]
+        if self.server.random.random() < options["corrupt_rate"]:
+            # The CDN error page with the successful status.
+            content = ERROR_PAGE
+        with self.server.lock:
+            self.server.stats["image_requests"] += 1
+            self.server.stats["bytes_sent"] += len(content)
+        self.reply(200, content, {"Content-Type": "image/jpeg"})
+
+    def reply(self, status: int, body: bytes, headers: Optional[Dict] = None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(port_queue: multiprocessing.Queue, options: Dict):
+    """Runs the fake Pexels server and puts its port into the queue.
+
+    Args:
+        port_queue (multiprocessing.Queue): queue to send the port of the server
+        options (Dict): latency, cdn_latency, error_rate, corrupt_rate, image_size
+            and total_results
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakePexelsHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.images = make_images(options["image_size"])
+    server.stats = Counter()
+    server.lock = threading.Lock()
+    server.random = random.Random(0)
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class FakePexelsServer:
+    """Starts the fake Pexels server in a separate process.
+
+    Args:
+        latency (float): delay of the search responses in seconds
+        cdn_latency (float): delay of the image responses in seconds
+        error_rate (float): share of the requests which fail
+        corrupt_rate (float): share of the images replaced with the HTML page
+        image_size (int): size of the served images in bytes
+        total_results (int): number of results for each search query
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        cdn_latency: float = 0.0,
+        error_rate: float = 0.0,
+        corrupt_rate: float = 0.0,
+        image_size: int = 256 * 1024,
+        total_results: int = 8000,
+    ):
+        self.options = {
+            "latency": latency,
+            "cdn_latency": cdn_latency,
+            "error_rate": error_rate,
+            "corrupt_rate": corrupt_rate,
+            "image_size": image_size,
+            "total_results": total_results,
+        }
+        self.process = None
+        self.url = None
+
+    def __enter__(self) -> "FakePexelsServer":
+        context = multiprocessing.get_context("spawn")
+        port_queue = context.Queue()
+        self.process = context.Process(
+            target=serve, args=(port_queue, self.options), daemon=True
+        )
+        self.process.start()
+        self.url = f"http://127.0.0.1:{port_queue.get(timeout=60)}"
+        return self
+
+    def __exit__(self, *args):
+        self.process.terminate()
+        self.process.join()
+
+    def stats(self) -> Counter:
+        """Returns the numbers of the served requests and bytes.
+
+        Returns:
+            Counter: search_requests, image_requests and bytes_sent
+        """
+        return Counter(requests.get(f"{self.url}/stats").json())
+
+
+class FakeApi:
+    """Replacement of sly.Api with the methods used by the app, which keeps
+    the uploaded images in memory and counts the calls of each method.
+
+    Args:
+        latency (float): delay of each call in seconds
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.bytes_uploaded = 0
+        self.lock = threading.Lock()
+        self.images: Dict[int, List[SimpleNamespace]] = {}
+        self.projects: Dict[int, SimpleNamespace] = {}
+        self.datasets: Dict[int, SimpleNamespace] = {}
+        self.files: Dict[str, bytes] = {}
+
+        self.image = FakeImageApi(self)
+        self.project = FakeProjectApi(self)
+        self.dataset = FakeDatasetApi(self)
+        self.file = FakeFileApi(self)
+
+    def call(self, method: str):
+        """Counts the call and waits for the configured latency."""
+        with self.lock:
+            self.calls[method] += 1
+        time.sleep(self.latency)
+
+
+class FakeImageApi:
+    def __init__(self, api: FakeApi):
+        self.api = api
+
+    def get_list(self, dataset_id: int) -> List[SimpleNamespace]:
+        self.api.call("image.get_list")
+        return list(self.api.images.get(dataset_id, []))
+
+    def upload_links(self, dataset_id, names, links, progress_cb=None, metas=None):
+        self.api.call("image.upload_links")
+        return self._add(dataset_id, names, metas, progress_cb)
+
+    def upload_paths(self, dataset_id, names, paths, progress_cb=None, metas=None):
+        self.api.call("image.upload_paths")
+        for path in paths:
+            with open(path, "rb") as f:
+                self.api.bytes_uploaded += len(f.read())
+            if progress_cb:
+                progress_cb(1)
+        return self._add(dataset_id, names, metas)
+
+    def upload_nps(self, dataset_id, names, imgs, progress_cb=None, metas=None):
+        self.api.call("image.upload_nps")
+        for img in imgs:
+            self.api.bytes_uploaded += img.nbytes
+            if progress_cb:
+                progress_cb(1)
+        return self._add(dataset_id, names, metas)
+
+    def _upload_data_bulk(self, func, items, progress_cb=None):
+        self.api.call("image._upload_data_bulk")
+        for item, _ in items:
+            self.api.bytes_uploaded += len(func(item))
+            if progress_cb:
+                progress_cb(1)
+
+    def upload_hashes(self, dataset_id, names, hashes, progress_cb=None, metas=None):
+        self.api.call("image.upload_hashes")
+        return self._add(dataset_id, names, metas, progress_cb)
+
+    def _add(self, dataset_id, names, metas, progress_cb=None) -> List[SimpleNamespace]:
+        metas = metas or [{}] * len(names)
+        if progress_cb:
+            progress_cb(len(names))
+        infos = [
+            SimpleNamespace(name=name, meta=meta) for name, meta in zip(names, metas)
+        ]
+        with self.api.lock:
+            self.api.images.setdefault(dataset_id, []).extend(infos)
+        return infos
+
+
+class FakeProjectApi:
+    def __init__(self, api: FakeApi):
+        self.api = api
+
+    def create(self, workspace_id, name, change_name_if_conflict=False):
+        self.api.call("project.create")
+        project = SimpleNamespace(
+            id=len(self.api.projects) + 1, name=name, custom_data={}
+        )
+        self.api.projects[project.id] = project
+        return project
+
+    def get_info_by_id(self, id):
+        self.api.call("project.get_info_by_id")
+        return self.api.projects[id]
+
+    def get_list(self, workspace_id):
+        self.api.call("project.get_list")
+        return list(self.api.projects.values())
+
+    def update_custom_data(self, id, data):
+        self.api.call("project.update_custom_data")
+        self.api.projects[id].custom_data = data
+
+
+class FakeDatasetApi:
+    def __init__(self, api: FakeApi):
+        self.api = api
+
+    def create(self, project_id, name, change_name_if_conflict=False):
+        self.api.call("dataset.create")
+        dataset = SimpleNamespace(
+            id=len(self.api.datasets) + 1, name=name, project_id=project_id
+        )
+        self.api.datasets[dataset.id] = dataset
+        return dataset
+
+    def get_info_by_id(self, id):
+        self.api.call("dataset.get_info_by_id")
+        dataset = self.api.datasets[id]
+        dataset.images_count = len(self.api.images.get(id, []))
+        return dataset
+
+    def get_list(self, project_id):
+        self.api.call("dataset.get_list")
+        datasets = [
+            dataset
+            for dataset in self.api.datasets.values()
+            if dataset.project_id == project_id
+        ]
+        for dataset in datasets:
+            dataset.images_count = len(self.api.images.get(dataset.id, []))
+        return datasets
+
+
+class FakeFileApi:
+    def __init__(self, api: FakeApi):
+        self.api = api
+
+    def exists(self, team_id, remote_path):
+        self.api.call("file.exists")
+        return remote_path in self.api.files
+
+    def upload(self, team_id, src, dst):
+        self.api.call("file.upload")
+        with open(src, "rb") as f:
+            self.api.files[dst] = f.read()
+
+    def download(self, team_id, remote_path, local_save_path):
+        self.api.call("file.download")
+        with open(local_save_path, "wb") as f:
+            f.write(self.api.files[remote_path])
+
+    def remove(self, team_id, path):
+        self.api.call("file.remove")
+        self.api.files.pop(path, None)
@@ -0,0 +1,89 @@
+"""Micro-benchmark for filtering the search results against the existing dataset.
+
+Compares the previous list-based membership checks with the hash-indexed
+filtering from src.index for growing numbers of results and existing images.
+
+Usage:
+    python -m benchmarks.filtering
+"""
+
+import os
+import time
+
+from collections import Counter
+from typing import Dict, List
+
+from src.index import build_index, filter_images
+
+ALLOWED_IMAGE_FORMATS = [".jpg", ".jpeg", ".png"]
+IMAGE_SIZE = "original"
+SIZES = [500, 1000, 2000, 4000, 8000]
+
+
+def make_results(number: int) -> List[Dict]:
+    """Generates fake search results where every tenth photo is a repeated one."""
+    images = []
+    for i in range(number):
+        photo_id = i - 1 if i % 10 == 9 else i
+        link = f"https://images.pexels.com/photos/{photo_id}/pexels-photo-{photo_id}.jpeg"
+        images.append({"id": photo_id, "src": {IMAGE_SIZE: link}})
+    return images
+
+
+def legacy_filter(images: List[Dict], existing_names: List[str]) -> int:
+    """Filtering with list lookups as it was implemented before the index."""
+    existing_names_without_ext = [name.split(".")[0] for name in existing_names]
+    links = []
+    for image in images:
+        link = image["src"][IMAGE_SIZE]
+        extension = os.path.splitext(link)[1]
+        name = f"pexels_{image['id']}" + extension
+        if extension not in ALLOWED_IMAGE_FORMATS or link in links:
+            continue
+        if name in existing_names or name.split(".")[0] in existing_names_without_ext:
+            continue
+        links.append(link)
+    return len(links)
+
+
+def indexed_filter(images: List[Dict], existing_names: List[str]) -> int:
+    """Filtering with hash lookups by Pexels photo ID."""
+    seen_ids = set()
+    existing_ids = build_index(existing_names)
+    filtered = filter_images(
+        images, IMAGE_SIZE, ALLOWED_IMAGE_FORMATS, seen_ids, existing_ids, Counter()
+    )
+    return sum(1 for _ in filtered)
+
+
+def measure(func, images: List[Dict], existing_names: List[str]) -> float:
+    """Returns the execution time of the filtering function in seconds."""
+    start = time.perf_counter()
+    func(images, existing_names)
+    return time.perf_counter() - start
+
+
+def main():
+    print(
+        f"{'results':>8} {'existing':>9} {'legacy, s':>10} "
+        f"{'indexed, s':>11} {'us/result':>10}"
+    )
+    for size in SIZES:
+        # The second half of the search results already exists in the dataset.
+        existing_names = [f"pexels_{i}.jpeg" for i in range(size // 2, size * 4)]
+        images = make_results(size)
+
+        assert legacy_filter(images, existing_names) == indexed_filter(
+            images, existing_names
+        )
+        legacy = measure(legacy_filter, images, existing_names)
+        indexed = measure(indexed_filter, images, existing_names)
+        per_result = indexed / size * 1e6
+        print(
+            f"{size:>8} {len(existing_names):>9} {legacy:>10.3f} "
+            f"{indexed:>11.4f} {per_result:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""End-to-end benchmark of the upload job with local stand-ins for Pexels and Supervisely.
+
+Runs the search, download and upload stages of the job against the fake Pexels server
+and the fake Supervisely API from benchmarks.fakes and reports the throughput in images
+and bytes per second, the peak RSS of the process and the numbers of API calls per image.
+No Pexels API key or Supervisely instance is needed. With "--engine all" each download
+engine is benchmarked in its own process with the same arguments and the reports
+are printed side by side.
+
+Usage:
+    python -m benchmarks.pipeline [--images 2000] [--upload-method files] [--json]
+    python -m benchmarks.pipeline --engine all --cdn-latency 200
+    python -m benchmarks.pipeline --images 500 --workspace-images 200
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from collections import Counter
+from typing import Dict, List, Optional
+
+from benchmarks.fakes import FakeApi, FakePexelsServer
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=2000, help="images per query")
+    parser.add_argument("--queries", type=int, default=1, help="number of queries")
+    parser.add_argument("--upload-method", choices=["files", "links"], default="files")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--search-workers", type=int, default=4)
+    parser.add_argument("--in-memory", action="store_true")
+    parser.add_argument("--spool-size", type=int, help="limit of the images on disk, MB")
+    parser.add_argument("--auto-tune", action="store_true")
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "asyncio", "all"],
+        default="threads",
+        help="download engine, all to compare the engines",
+    )
+    parser.add_argument(
+        "--workspace-images",
+        type=int,
+        default=0,
+        help="images per query uploaded by the previous job, skipped as duplicates",
+    )
+    parser.add_argument("--image-size", type=int, default=256, help="image size, KB")
+    parser.add_argument("--latency", type=float, default=50, help="search latency, ms")
+    parser.add_argument("--cdn-latency", type=float, default=20, help="CDN latency, ms")
+    parser.add_argument("--upload-latency", type=float, default=100, help="ms per call")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--corrupt-rate", type=float, default=0.0)
+    parser.add_argument(
+        "--cancel-after",
+        type=float,
+        help="cancel the job after the seconds to measure how long the cancel takes",
+    )
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--output", help="path to save the report as JSON")
+    return parser.parse_args()
+
+
+def configure_environment(
+    data_dir: str, pexels_url: str, spool_size: Optional[int] = None
+):
+    """Sets the environment variables for the app before importing its modules,
+    so the app uses the fake Pexels server, temporary directories and no rate pacing.
+
+    Args:
+        data_dir (str): temporary directory for the app data
+        pexels_url (str): URL of the fake Pexels server
+        spool_size (Optional[int]): limit of the downloaded images on disk in MB
+    """
+    os.environ.setdefault("SERVER_ADDRESS", "http://127.0.0.1:1")
+    os.environ.setdefault("API_TOKEN", "0" * 128)
+    os.environ.setdefault("TEAM_ID", "1")
+    os.environ.setdefault("WORKSPACE_ID", "1")
+    os.environ["SLY_APP_DATA_DIR"] = data_dir
+    os.environ["PEXELS_API_URL"] = f"{pexels_url}/v1/search"
+    os.environ["PEXELS_CACHE_PATH"] = os.path.join(data_dir, "cache", "search.db")
+    os.environ["PEXELS_REQUESTS_PER_SECOND"] = "1000"
+    os.environ["PEXELS_BURST_SIZE"] = "1000"
+    if spool_size is not None:
+        os.environ["PEXELS_SPOOL_SIZE"] = str(spool_size)
+
+
+def run(args: argparse.Namespace, server: FakePexelsServer, api: FakeApi) -> Dict:
+    """Runs the upload job with the app modules and returns the report.
+
+    Args:
+        args (argparse.Namespace): benchmark arguments
+        server (FakePexelsServer): started fake Pexels server
+        api (FakeApi): fake Supervisely API
+
+    Returns:
+        Dict: benchmark report
+    """
+    import src.globals as g
+    import src.engine as engine
+
+    from src.journal import Journal
+
+    g.api = api
+    images_dir = os.path.join(g.SLY_APP_DATA_DIR, g.IMAGES_TMP_DIR)
+    queries = [f"benchmark {number}" for number in range(args.queries)]
+    params = {
+        "search_query": queries,
+        "images_number": args.images,
+        "start_number": 0,
+        "image_size": "original",
+        "metadata": list(g.REQUIRED_METADATA_FIELDS.keys()),
+        "upload_method": args.upload_method,
+        "batch_size": args.batch_size,
+        "max_workers": args.workers,
+        "search_workers": args.search_workers,
+        "in_memory": args.in_memory,
+        "auto_tune": args.auto_tune,
+        "download_engine": args.engine,
+        "skip_workspace_duplicates": bool(args.workspace_images),
+        "project_id": None,
+        "dataset_id": None,
+        "project_name": None,
+        "dataset_name": None,
+    }
+
+    base_stats = Counter()
+    if args.workspace_images:
+        # The previous job uploads the first results of the queries to another project
+        # of the workspace, its requests and calls are not counted.
+        engine.Job(
+            Journal({**params, "images_number": args.workspace_images}), "benchmark"
+        ).run()
+        base_stats = server.stats()
+        api.calls.clear()
+    job = engine.Job(Journal(params), "benchmark")
+
+    cancelled_at = None
+    if args.cancel_after is not None:
+
+        def cancel():
+            nonlocal cancelled_at
+            cancelled_at = time.perf_counter()
+            job.cancel()
+
+        timer = threading.Timer(args.cancel_after, cancel)
+        timer.daemon = True
+        timer.start()
+
+    start = time.perf_counter()
+    summary = job.run()
+    elapsed = time.perf_counter() - start
+    finished_at = time.perf_counter()
+
+    stats = server.stats() - base_stats
+    # Partially downloaded files must be removed even if the job was cancelled.
+    temp_files_left = len(os.listdir(images_dir)) if os.path.isdir(images_dir) else 0
+    uploaded = summary["uploaded_images"]
+    return {
+        "uploaded_images": uploaded,
+        "bad_files": summary["bad_files"],
+        "workspace_duplicates": summary["workspace_duplicates"],
+        "failed_downloads": len(summary["failed_downloads"]),
+        "seconds": round(elapsed, 3),
+        "images_per_second": round(uploaded / elapsed, 1),
+        "megabytes_per_second": round(stats["bytes_sent"] / elapsed / 2**20, 2),
+        "peak_spool_mb": round(job.spool.peak_used / 2**20, 1),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "pexels_calls_per_image": round(
+            (stats["search_requests"] + stats["image_requests"]) / max(uploaded, 1), 3
+        ),
+        "supervisely_calls_per_image": round(
+            sum(api.calls.values()) / max(uploaded, 1), 3
+        ),
+        "supervisely_calls": dict(api.calls),
+        "cancel_seconds": round(finished_at - cancelled_at, 3) if cancelled_at else None,
+        "temp_files_left": temp_files_left,
+        "download_engine": summary["download_engine"],
+        "workers": summary["workers"],
+        "batch_size": summary["batch_size"],
+    }
+
+
+def compare(argv: List[str]) -> Dict[str, Dict]:
+    """Runs the benchmark of each download engine in a separate process, so the peak
+    RSS of one engine doesn't affect the other.
+
+    Args:
+        argv (List[str]): command line arguments of the benchmark without the engine
+
+    Returns:
+        Dict[str, Dict]: reports by engines
+    """
+    reports = {}
+    with tempfile.TemporaryDirectory() as reports_dir:
+        for engine in ["threads", "asyncio"]:
+            path = os.path.join(reports_dir, f"{engine}.json")
+            command = [sys.executable, "-m", "benchmarks.pipeline", *argv]
+            command += ["--engine", engine, "--output", path]
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            with open(path) as f:
+                reports[engine] = json.load(f)
+    return reports
+
+
+def main():
+    args = parse_args()
+    if args.engine == "all":
+        # The engine and the output are set for each process separately.
+        argv, skip = [], False
+        for arg in sys.argv[1:]:
+            if not skip and arg not in ("--engine", "--output", "--json"):
+                argv.append(arg)
+            skip = arg in ("--engine", "--output")
+        reports = compare(argv)
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(reports, f, indent=4)
+        if args.json:
+            print(json.dumps(reports, indent=4))
+            return
+        print(f"{'':>28}  " + "".join(f"{engine:>16}" for engine in reports))
+        for key, value in reports["threads"].items():
+            if isinstance(value, dict):
+                continue
+            values = "".join(f"{str(report[key]):>16}" for report in reports.values())
+            print(f"{key:>28}: {values}")
+        return
+
+    server = FakePexelsServer(
+        latency=args.latency / 1000,
+        cdn_latency=args.cdn_latency / 1000,
+        error_rate=args.error_rate,
+        corrupt_rate=args.corrupt_rate,
+        image_size=args.image_size * 1024,
+        total_results=max(args.images * 2, 8000),
+    )
+    with server, tempfile.TemporaryDirectory() as data_dir:
+        configure_environment(data_dir, server.url, args.spool_size)
+        report = run(args, server, FakeApi(latency=args.upload_latency / 1000))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=4)
+    if args.json:
+        print(json.dumps(report, indent=4))
+        return
+    for key, value in report.items():
+        print(f"{key:>28}: {value}")
+
+
+if __name__ == "__main__":
+    main()
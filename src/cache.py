@@ -0,0 +1,135 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from typing import Dict, Optional
+
+import supervisely as sly
+
+
+class SearchCache:
+    """Persistent cache of the Pexels API search responses in the SQLite database.
+    Entries are keyed by the search request parameters, expire after the TTL and
+    the least recently used entries are evicted when the cache exceeds the size limit.
+
+    Args:
+        path (str): path to the SQLite database file
+        ttl (int): time to live of the cache entries in seconds
+        max_size (int): maximum total size of the cached responses in bytes
+    """
+
+    def __init__(self, path: str, ttl: int, max_size: int):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on the first use and creates the table if needed.
+
+        Returns:
+            sqlite3.Connection: connection to the database
+        """
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS search ("
+                "key TEXT PRIMARY KEY, data BLOB, size INTEGER, "
+                "created_at REAL, accessed_at REAL)"
+            )
+            sly.logger.debug(f"Search cache is opened at {self.path}.")
+        return self.connection
+
+    @staticmethod
+    def get_key(params: Dict) -> str:
+        """Returns the cache key for the search request parameters.
+
+        Args:
+            params (Dict): search request parameters (query, page, per_page, filters)
+
+        Returns:
+            str: cache key
+        """
+        return json.dumps(params, sort_keys=True)
+
+    def get(self, params: Dict) -> Optional[Dict]:
+        """Returns the cached response for the search request if it's not expired.
+
+        Args:
+            params (Dict): search request parameters
+
+        Returns:
+            Optional[Dict]: cached response data or None if there is no valid entry
+        """
+        key = self.get_key(params)
+        now = time.time()
+        try:
+            with self.lock:
+                connection = self._connect()
+                row = connection.execute(
+                    "SELECT data FROM search WHERE key = ? AND created_at > ?",
+                    (key, now - self.ttl),
+                ).fetchone()
+                if row is None:
+                    return
+                connection.execute(
+                    "UPDATE search SET accessed_at = ? WHERE key = ?", (now, key)
+                )
+                connection.commit()
+            return json.loads(zlib.decompress(row[0]))
+        except (sqlite3.Error, zlib.error, ValueError) as error:
+            sly.logger.warning(f"Can't read the search cache: {error}.")
+
+    def set(self, params: Dict, data: Dict):
+        """Saves the response for the search request and evicts the expired and
+        least recently used entries if the cache exceeds the size limit.
+
+        Args:
+            params (Dict): search request parameters
+            data (Dict): response data to cache
+        """
+        blob = zlib.compress(json.dumps(data).encode())
+        now = time.time()
+        try:
+            with self.lock:
+                connection = self._connect()
+                connection.execute(
+                    "INSERT OR REPLACE INTO search VALUES (?, ?, ?, ?, ?)",
+                    (self.get_key(params), blob, len(blob), now, now),
+                )
+                connection.execute(
+                    "DELETE FROM search WHERE created_at <= ?", (now - self.ttl,)
+                )
+                self._evict(connection)
+                connection.commit()
+        except sqlite3.Error as error:
+            sly.logger.warning(f"Can't write the search cache: {error}.")
+
+    def _evict(self, connection: sqlite3.Connection):
+        """Deletes the least recently used entries while the cache exceeds the size limit.
+
+        Args:
+            connection (sqlite3.Connection): connection to the database
+        """
+        total_size = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM search"
+        ).fetchone()[0]
+        if total_size <= self.max_size:
+            return
+
+        rows = connection.execute(
+            "SELECT key, size FROM search ORDER BY accessed_at"
+        ).fetchall()
+        evicted = []
+        for key, size in rows:
+            if total_size <= self.max_size:
+                break
+            evicted.append((key,))
+            total_size -= size
+        connection.executemany("DELETE FROM search WHERE key = ?", evicted)
+        sly.logger.debug(f"Evicted {len(evicted)} entries from the search cache.")
@@ -0,0 +1,230 @@
+import os
+import threading
+
+from typing import Iterator, List, Optional, Set
+
+import numpy as np
+import supervisely as sly
+
+import src.globals as g
+import src.index as index
+
+
+class DatasetIndex:
+    """Persisted index of the Pexels photo IDs in the dataset, which allows to skip
+    listing all images of the dataset before each job. The index is saved as the sorted
+    array of IDs with the number of images in the dataset, locally after each uploaded
+    batch and to the team files when the job is finished. The index is valid while
+    the number of images in the dataset is the same, otherwise the dataset is relisted.
+
+    Args:
+        dataset_id (int): ID of the dataset
+        ids (Set[int]): Pexels photo IDs of the images in the dataset
+        images_count (int): number of all images in the dataset when the index was updated
+    """
+
+    def __init__(self, dataset_id: int, ids: Set[int], images_count: int):
+        self.dataset_id = dataset_id
+        self.ids = ids
+        self.images_count = images_count
+        self.lock = threading.Lock()
+
+    @property
+    def local_path(self) -> str:
+        """Path to the index file in the app data."""
+        return get_local_path(self.dataset_id)
+
+    @property
+    def remote_path(self) -> str:
+        """Path to the index file in the team files."""
+        return get_remote_path(self.dataset_id)
+
+    @classmethod
+    def load(
+        cls, dataset_id: int, images_count: Optional[int] = None
+    ) -> "DatasetIndex":
+        """Loads the index of the dataset from the app data or from the team files
+        and checks it with the number of images in the dataset. If there is no index
+        or the dataset was changed by someone else, the index is built from the list
+        of the dataset images and saved.
+
+        Args:
+            dataset_id (int): ID of the dataset
+            images_count (Optional[int]): number of images in the dataset if it's already
+                known from the dataset info, otherwise it's requested
+
+        Returns:
+            DatasetIndex: index of the dataset
+        """
+        if images_count is None:
+            images_count = g.api.dataset.get_info_by_id(dataset_id).images_count
+        dataset_index = cls.read(dataset_id)
+        if dataset_index is not None and dataset_index.images_count == images_count:
+            sly.logger.info(
+                f"Loaded the index of {len(dataset_index.ids)} Pexels photos "
+                f"of the dataset {dataset_id}."
+            )
+            return dataset_index
+
+        if dataset_index is not None:
+            sly.logger.info(
+                f"The dataset {dataset_id} has {images_count} images, but the index "
+                f"has {dataset_index.images_count}, so the dataset is listed again."
+            )
+        names = [image.name for image in g.api.image.get_list(dataset_id)]
+        dataset_index = cls(dataset_id, index.build_index(names), len(names))
+        sly.logger.info(
+            f"Built the index of {len(dataset_index.ids)} Pexels photos "
+            f"from {len(names)} images of the dataset {dataset_id}."
+        )
+        dataset_index.save(remote=True)
+        return dataset_index
+
+    @classmethod
+    def read(cls, dataset_id: int) -> Optional["DatasetIndex"]:
+        """Reads the saved index of the dataset without checking it.
+
+        Args:
+            dataset_id (int): ID of the dataset
+
+        Returns:
+            Optional[DatasetIndex]: saved index or None if there is no one
+        """
+        local_path = get_local_path(dataset_id)
+        remote_path = get_remote_path(dataset_id)
+        try:
+            if not os.path.exists(local_path):
+                if not g.api.file.exists(g.TEAM_ID, remote_path):
+                    return
+                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                g.api.file.download(g.TEAM_ID, remote_path, local_path)
+            with np.load(local_path) as data:
+                ids = set(data["ids"].tolist())
+                images_count = int(data["images_count"])
+        except Exception as error:
+            sly.logger.warning(
+                f"The index of the dataset {dataset_id} was not loaded with error: {error}."
+            )
+            return
+        return cls(dataset_id, ids, images_count)
+
+    def add(self, names: List[str]):
+        """Adds the uploaded images to the index and saves it locally.
+
+        Args:
+            names (List[str]): names of the uploaded images
+        """
+        with self.lock:
+            self.ids.update(index.build_index(names))
+            self.images_count += len(names)
+        self.save()
+
+    def save(self, remote: bool = False):
+        """Saves the index to the app data and optionally to the team files.
+
+        Args:
+            remote (bool): if True, the index is also uploaded to the team files
+        """
+        with self.lock:
+            ids = np.array(sorted(self.ids), dtype=np.uint64)
+            os.makedirs(os.path.dirname(self.local_path), exist_ok=True)
+            # The file object is used, so numpy doesn't add the extension to the path.
+            with open(self.local_path, "wb") as f:
+                np.savez_compressed(f, ids=ids, images_count=self.images_count)
+
+            if not remote:
+                return
+            try:
+                if g.api.file.exists(g.TEAM_ID, self.remote_path):
+                    g.api.file.remove(g.TEAM_ID, self.remote_path)
+                g.api.file.upload(g.TEAM_ID, self.local_path, self.remote_path)
+            except Exception as error:
+                sly.logger.warning(
+                    f"The index of the dataset {self.dataset_id} was not saved "
+                    f"to the team files with error: {error}."
+                )
+
+
+class WorkspaceIndex:
+    """Index of the Pexels photo IDs of all datasets in the projects of the workspace
+    which were created or updated by the app. The IDs are kept in the sorted numpy array,
+    8 bytes per photo instead of about 70 bytes of the set of Python ints, and
+    are checked with the binary search.
+
+    Args:
+        ids (np.ndarray): sorted unique Pexels photo IDs
+    """
+
+    def __init__(self, ids: np.ndarray):
+        self.ids = ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, photo_id: int) -> bool:
+        position = np.searchsorted(self.ids, photo_id)
+        return position < len(self.ids) and self.ids[position] == photo_id
+
+    @classmethod
+    def build(cls, workspace_id: int) -> "WorkspaceIndex":
+        """Builds the index from the saved indexes of the datasets of the projects,
+        which have the app entry in the custom data. The datasets without the index
+        or with the outdated one are listed and their indexes are saved.
+
+        Args:
+            workspace_id (int): ID of the workspace
+
+        Returns:
+            WorkspaceIndex: index of the workspace
+        """
+        arrays = [
+            np.fromiter(dataset_index.ids, dtype=np.uint64, count=len(dataset_index.ids))
+            for dataset_index in iter_indexes(workspace_id)
+        ]
+        ids = np.unique(np.concatenate(arrays)) if arrays else np.array([], np.uint64)
+        sly.logger.info(
+            f"Built the index of {len(ids)} Pexels photos from {len(arrays)} datasets "
+            f"of the workspace {workspace_id}."
+        )
+        return cls(ids)
+
+
+def iter_indexes(workspace_id: int) -> Iterator[DatasetIndex]:
+    """Loads the indexes of the datasets of the projects in the workspace, which have
+    the app entry in the custom data, one by one.
+
+    Args:
+        workspace_id (int): ID of the workspace
+
+    Yields:
+        Iterator[DatasetIndex]: index of each dataset
+    """
+    for project in g.api.project.get_list(workspace_id):
+        if g.CUSTOM_DATA_KEY not in (project.custom_data or {}):
+            continue
+        for dataset in g.api.dataset.get_list(project.id):
+            yield DatasetIndex.load(dataset.id, dataset.images_count)
+
+
+def get_local_path(dataset_id: int) -> str:
+    """Returns the path to the index file of the dataset in the app data.
+
+    Args:
+        dataset_id (int): ID of the dataset
+
+    Returns:
+        str: local path to the index file
+    """
+    return os.path.join(g.DATASET_INDEX_LOCAL_DIR, f"dataset_{dataset_id}.npz")
+
+
+def get_remote_path(dataset_id: int) -> str:
+    """Returns the path to the index file of the dataset in the team files.
+
+    Args:
+        dataset_id (int): ID of the dataset
+
+    Returns:
+        str: path to the index file in the team files
+    """
+    return f"{g.DATASET_INDEX_REMOTE_DIR}/dataset_{dataset_id}.npz"
@@ -0,0 +1,1766 @@
+import asyncio
+import itertools
+import math
+import os
+import queue
+import requests
+import threading
+import time
+
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    List,
+    Dict,
+    Set,
+    Tuple,
+    Optional,
+    Iterator,
+    Mapping,
+    Union,
+)
+from collections import defaultdict, Counter
+
+import supervisely as sly
+from supervisely._utils import get_bytes_hash
+
+import src.globals as g
+import src.index as index
+import src.metrics as metrics
+import src.pexels as pexels
+import src.phash as phash
+import src.photo as photo
+import src.pipeline as pipeline
+import src.spool as spool
+import src.validation as validation
+
+from src.dataset_index import DatasetIndex, WorkspaceIndex
+from src.journal import Journal
+from src.photo import Photo
+from src.tuning import AutoTuner
+
+# Key of the counter for the images skipped as near-duplicates.
+NEAR_DUPLICATES = "near_duplicates"
+
+
+class Job:
+    """Upload job, which searches images on Pexels, downloads them and uploads to the
+    dataset. The search, download and upload stages run at the same time and are
+    connected with bounded queues. The job doesn't depend on the UI, so it can be
+    started from the widgets callbacks and in the headless mode.
+    The job can have several search queries, which are searched concurrently under
+    the shared API rate limit, and each photo is uploaded only once. With sharded
+    search each query is split into sub-queries by the search filters to get more
+    results than the API returns for one query.
+
+    Args:
+        journal (Journal): journal with the parameters of the new or unfinished job
+        api_key (str): Pexels API key
+    """
+
+    def __init__(self, journal: Journal, api_key: str):
+        self.journal = journal
+        self.api_key = api_key
+
+        params = journal.params
+        self.search_queries = get_search_queries(params["search_query"])
+        # Joined queries are used for the names of the created project and dataset.
+        self.search_query = f"{g.QUERY_SEPARATOR} ".join(self.search_queries)
+        # Number of images to search for each query.
+        self.images_number = params["images_number"]
+        self.total_images_number = self.images_number * len(self.search_queries)
+        self.start_number = params["start_number"]
+        self.image_size = params["image_size"]
+        # Maximum dimension and quality of the images resized by the CDN.
+        self.target_dimension = params.get(
+            "target_dimension", g.DEFAULT_TARGET_DIMENSION
+        )
+        self.target_quality = params.get("target_quality", g.DEFAULT_TARGET_QUALITY)
+        self.metadata = params["metadata"]
+        # Metadata fields shared by the records of all found images.
+        self.metadata_fields = photo.get_fields(self.metadata)
+        self.upload_method = params["upload_method"]
+        self.batch_size = params["batch_size"]
+        self.max_workers = params["max_workers"]
+        self.search_workers = params["search_workers"]
+        self.in_memory = params["in_memory"]
+        self.skip_near_duplicates = params.get("skip_near_duplicates", False)
+        self.skip_workspace_duplicates = params.get("skip_workspace_duplicates", False)
+        self.shard_filters = params.get("shard_filters", [])
+        self.download_engine = params.get("download_engine", "threads")
+        if self.download_engine == "asyncio" and pexels.aiohttp is None:
+            sly.logger.warning(
+                "The asyncio download engine requires the aiohttp package, "
+                "the thread engine is used instead."
+            )
+            self.download_engine = "threads"
+
+        # Tuner of the number of workers and the batch size, None if they are fixed.
+        self.tuner = None
+        if params.get("auto_tune", False):
+            if self.download_engine == "asyncio":
+                # Downloads on the event loop are cheap, so start from the global limit.
+                workers = max_workers = g.ASYNC_DOWNLOAD_CONCURRENCY
+            else:
+                workers, max_workers = self.max_workers, g.AUTO_TUNE_MAX_WORKERS
+            self.tuner = AutoTuner(
+                workers,
+                self.batch_size,
+                (g.AUTO_TUNE_MIN_WORKERS, max_workers),
+                (g.AUTO_TUNE_MIN_BATCH_SIZE, g.AUTO_TUNE_MAX_BATCH_SIZE),
+            )
+        self.project_id = params["project_id"]
+        self.dataset_id = params["dataset_id"]
+
+        # Token checked by all stages of the job, cancelled by cancel().
+        self.cancel_token = pipeline.CancellationToken()
+
+        # Budget for the downloaded images kept in memory, zero means always use disk.
+        self.memory_budget = pipeline.MemoryBudget(
+            g.MEMORY_BUDGET if self.in_memory else 0
+        )
+        # Temporary directory for the downloaded images with the limited size.
+        self.spool = spool.Spool(g.SPOOL_DIR, g.SPOOL_SIZE, g.SPOOL_DEFAULT_FILE_SIZE)
+        # Index of the Pexels photo IDs in the dataset, loaded when the search starts.
+        self.dataset_index: Optional[DatasetIndex] = None
+        # Index of the Pexels photo IDs in the workspace, empty if they are not skipped.
+        self.workspace_index = ()
+        # Index of perceptual hashes, None if near-duplicates are not skipped.
+        self.hash_index = None
+
+        # Counters of the skipped images for the result messages.
+        self.counters = Counter()
+        # Guards the index of the found photos and the counters shared by the queries.
+        self.lock = threading.Lock()
+        # Numbers of the found images for each query and for each shard of sharded search.
+        self.found_by_query = Counter()
+        self.found_by_shard = Counter()
+        self.has_errors = False
+        # Error which has stopped the job, e.g. the failure of the search stage.
+        self.error: Optional[str] = None
+        # Downloads which failed all retries: the images with transient errors to requeue
+        # and the causes of the failures by the image names for the final report.
+        self.requeued_downloads: List[Photo] = []
+        self.failed_downloads: Dict[str, str] = {}
+
+        # Images uploaded before the job was interrupted are not counted in the results
+        # of this run, they are already recorded by the interrupted one.
+        self.resumed_ids = frozenset(journal.uploaded_ids)
+        self.uploaded_images_number = 0
+        self.found_images_number = 0
+
+    @property
+    def filtered_images(self) -> int:
+        """Number of the search results filtered out as bad results."""
+        return (
+            self.counters[index.BAD_LINKS]
+            + self.counters[index.BAD_EXTENSIONS]
+            + self.counters[index.DUPLICATES]
+            + self.counters[index.BAD_FILES]
+        )
+
+    @property
+    def source_size(self) -> str:
+        """Size of the image in the search results to download, the original images
+        are resized by the CDN for the target size."""
+        if self.image_size == g.TARGET_IMAGE_SIZE:
+            return "original"
+        return self.image_size
+
+    def get_link(self, link: str) -> str:
+        """Returns the link to download the image of the chosen size.
+
+        Args:
+            link (str): link to the image of the source size from the search results
+
+        Returns:
+            str: link to the resized image for the target size, the same link otherwise
+        """
+        if self.image_size != g.TARGET_IMAGE_SIZE:
+            return link
+        return pexels.get_resized_link(
+            link, self.target_dimension, self.target_quality
+        )
+
+    def is_running(self) -> bool:
+        """Returns True if the job wasn't cancelled.
+
+        Returns:
+            bool: False if the job was cancelled
+        """
+        return self.cancel_token.is_running()
+
+    def cancel(self):
+        """Stops all stages of the job: in-flight downloads and uploads are interrupted
+        at the next chunk, waiting for the API rate limit or retries is interrupted
+        immediately and the queued images are skipped."""
+        self.cancel_token.cancel()
+
+    def get_required_requests(self) -> int:
+        """Returns the number of the Pexels API requests needed to finish the job.
+
+        Returns:
+            int: number of the search pages which are not in the journal
+        """
+        if self.shard_filters:
+            # Number of pages of each shard is not known before the search,
+            # so only the minimum number of requests is estimated.
+            required_requests = 0
+            for search_query in self.search_queries:
+                fetched_pages = sum(
+                    len(self.journal.pages.get(shard_key, {}))
+                    for shard_key, _ in self.get_shards(search_query)
+                )
+                pages_number = math.ceil(self.images_number / g.IMAGES_PER_PAGE)
+                required_requests += max(pages_number - fetched_pages, 0)
+            return required_requests
+
+        start_page_number, _, end_page_number, _ = get_pages(
+            self.images_number, self.start_number
+        )
+        return sum(
+            not self.journal.has_page(search_query, page_number)
+            for search_query in self.search_queries
+            for page_number in range(start_page_number, end_page_number + 1)
+        )
+
+    def run(self, progress_cb: Optional[Callable[[int], Any]] = None) -> Dict:
+        """Runs the job until all images are uploaded or the job is cancelled.
+
+        Args:
+            progress_cb (Optional[Callable[[int], Any]]): called with the number of
+                images uploaded in each batch
+
+        Returns:
+            Dict: summary of the job
+        """
+        # Metrics of the stages are collected for each job separately.
+        metrics.registry.reset()
+
+        # Size the connection pool to the number of download workers.
+        pexels.configure_session(
+            self.tuner.max_workers if self.tuner else self.max_workers
+        )
+
+        sly.logger.debug(
+            f"Started with the following parameters: Search queries: {self.search_queries}; "
+            f"Images number: {self.images_number}; Starting image number: {self.start_number}; "
+            f"Image size: {self.image_size}; Target dimension: {self.target_dimension}; "
+            f"Target quality: {self.target_quality}; Metadata: {self.metadata}; "
+            f"Upload method: {self.upload_method}; Batch size: {self.batch_size}; "
+            f"Max workers: {self.max_workers}; Search workers: {self.search_workers}; "
+            f"Upload from memory: {self.in_memory}; Shard filters: {self.shard_filters}; "
+            f"Auto-tuning: {self.tuner is not None}; "
+            f"Skip workspace duplicates: {self.skip_workspace_duplicates}; "
+            f"Download engine: {self.download_engine}; "
+            f"Resumed pages: {self.journal.pages_number}; "
+            f"Resumed images: {len(self.resumed_ids)}."
+        )
+
+        if self.shard_filters and self.start_number:
+            sly.logger.warning(
+                "Starting image number is not used with sharded search, "
+                "each shard is searched from the first page."
+            )
+
+        if self.skip_near_duplicates and self.upload_method == "files":
+            self.hash_index = self.build_hash_index()
+
+        # Save the journal before starting, so the job can be resumed if the task is stopped.
+        self.journal.save(remote=True)
+
+        if progress_cb and self.resumed_ids:
+            progress_cb(len(self.resumed_ids))
+
+        stages = []
+        try:
+            self.upload_images(self.images_from_pexels(), stages, progress_cb)
+
+            # The images which failed all download retries are requeued after the others,
+            # so the transient errors of the CDN don't make the job come up short.
+            for round_number in range(1, g.DOWNLOAD_REQUEUE_ROUNDS + 1):
+                if not self.requeued_downloads or not self.is_running():
+                    break
+                requeued, self.requeued_downloads = self.requeued_downloads, []
+                sly.logger.info(
+                    f"Requeued {len(requeued)} failed downloads "
+                    f"(round {round_number} of {g.DOWNLOAD_REQUEUE_ROUNDS})."
+                )
+                for requeued_photo in requeued:
+                    self.failed_downloads.pop(requeued_photo.name, None)
+                self.upload_images(iter(requeued), stages, progress_cb)
+        except BaseException:
+            # Stop the other stages if the upload failed, the job can be resumed.
+            self.cancel()
+            raise
+        finally:
+            # Wait for the interrupted stages to stop, so the partially downloaded files
+            # are not written after the spool is cleared.
+            for stage in stages:
+                stage.join(g.CONNECT_TIMEOUT + g.READ_TIMEOUT)
+            # Delete the downloaded images left in the spool, keeping the search cache.
+            self.spool.clear()
+            if not self.is_running():
+                # Save the latest progress of the interrupted job to the team files.
+                self.journal.upload(force=True)
+            if self.dataset_index is not None:
+                self.dataset_index.save(remote=True)
+
+        if self.uploaded_images_number:
+            self.update_custom_data()
+
+        if self.is_running() or not (
+            self.resumed_ids or self.found_images_number or self.error
+        ):
+            # The job is finished or there is nothing to resume.
+            self.journal.remove()
+
+        if self.tuner:
+            sly.logger.info(
+                f"Auto-tuning finished with {self.tuner.workers} download workers "
+                f"and batch size {self.tuner.batch_size}."
+            )
+
+        if self.upload_method == "files":
+            sly.logger.info(
+                f"Peak size of the downloaded images on disk: {self.spool.peak_used} "
+                f"bytes, the limit is {self.spool.limit} bytes."
+            )
+
+        if self.failed_downloads:
+            # Report the photos which are missing in the dataset because of the errors.
+            failures = "; ".join(
+                f"{index.get_pexels_id(name)}: {cause}"
+                for name, cause in self.failed_downloads.items()
+            )
+            sly.logger.warning(
+                f"Failed to download {len(self.failed_downloads)} photos "
+                f"with the following Pexels IDs and causes: {failures}."
+            )
+
+        for stage, stage_summary in metrics.registry.summary().items():
+            sly.logger.info(f"Stage {stage} metrics: {stage_summary}.")
+
+        summary = self.get_summary()
+        sly.logger.info(f"Job finished with the following results: {summary}.")
+        return summary
+
+    def upload_images(
+        self,
+        source: Iterator[Photo],
+        stages: List[threading.Thread],
+        progress_cb: Optional[Callable[[int], Any]] = None,
+    ):
+        """Runs the download and validation stages for the images from the source
+        and uploads them to the dataset by batches until the source is exhausted
+        or the job is cancelled.
+
+        Args:
+            source (Iterator[Photo]): found images
+            stages (List[threading.Thread]): started stage threads, updated in place
+                so the caller can wait for them
+            progress_cb (Optional[Callable[[int], Any]]): called with the number of
+                images uploaded in each batch
+        """
+        # Search, download and upload stages run at the same time and are connected
+        # with bounded queues, so memory usage doesn't depend on the number of images.
+        search_results = queue.Queue(maxsize=self.batch_size)
+        stages.append(pipeline.produce(source, search_results, self.is_running))
+
+        if self.upload_method == "files":
+            # If the upload method is files, download the images instead of using the links.
+            downloaded = queue.Queue(maxsize=self.batch_size)
+            stages.append(self.download_images(search_results, downloaded))
+            # Check the downloaded files, so only valid images are uploaded.
+            upload_queue = queue.Queue(maxsize=self.batch_size)
+            validation_stage = pipeline.map_concurrently(
+                self.validate_image,
+                downloaded,
+                upload_queue,
+                g.VALIDATION_WORKERS,
+                self.is_running,
+            )
+            stages.append(validation_stage)
+        else:
+            upload_queue = search_results
+
+        batch_size = self.tuner.get_batch_size if self.tuner else self.batch_size
+        # Incomplete batch is uploaded if the downloads wait for the free space in the spool.
+        batches = pipeline.batched(
+            upload_queue, batch_size, self.is_running, self.spool.is_full
+        )
+        try:
+            self.upload_batches(batches, progress_cb)
+        except pipeline.StageError as error:
+            # The job is stopped as interrupted, so its journal is kept for resuming.
+            sly.logger.error(f"The job has stopped with error: {error}.")
+            self.error = str(error)
+            self.has_errors = True
+            self.cancel()
+
+    def upload_batches(
+        self,
+        batches: Iterator[List[Photo]],
+        progress_cb: Optional[Callable[[int], Any]] = None,
+    ):
+        """Uploads the batches of the found images to the dataset, creating the project
+        and the dataset before the first batch, and saves the uploaded images
+        to the journal.
+
+        Args:
+            batches (Iterator[List[Photo]]): batches of the found images, downloaded
+                if the upload method is files
+            progress_cb (Optional[Callable[[int], Any]]): called with the number of
+                images uploaded in each batch
+
+        Raises:
+            pipeline.StageError: if one of the stages has stopped with error
+        """
+        for batch in batches:
+            # Check if the job was cancelled.
+            if not self.is_running():
+                return
+
+            self.found_images_number += len(batch)
+
+            # Create the project and dataset if they don't exist.
+            if not self.project_id:
+                self.project_id = create_project(
+                    self.journal.params["project_name"], self.search_query
+                )
+                self.journal.update_params(project_id=self.project_id)
+            if not self.dataset_id:
+                self.dataset_id = create_dataset(
+                    self.project_id,
+                    self.journal.params["dataset_name"],
+                    self.search_query,
+                )
+                self.journal.update_params(dataset_id=self.dataset_id)
+                self.dataset_index = DatasetIndex(self.dataset_id, set(), 0)
+
+            # The downloads finish in any order, so the batch is sorted in the order
+            # of the search results: the earlier of the near-duplicates is kept
+            # and the images are uploaded in the same order as in the search.
+            batch.sort(key=lambda image: image.order)
+
+            if self.hash_index is not None:
+                # Skip the images which are visually similar to the existing ones.
+                batch = self.remove_near_duplicates(batch)
+                if not batch:
+                    continue
+            batch_names = [image.name for image in batch]
+            batch_links = [
+                image.link if image.source is None else image.source for image in batch
+            ]
+
+            # Upload the batch of images to the dataset.
+            batch_bytes = get_batch_size_in_bytes(batch_links, self.upload_method)
+            upload_start = time.monotonic()
+            try:
+                uploaded_batch_images_number = self.upload_images_to_dataset(
+                    batch_names, batch_links, [image.meta for image in batch]
+                )
+            except pipeline.Cancelled:
+                # The batch may be partially uploaded, its images are not marked
+                # in the journal, so they are checked in the dataset when resumed.
+                sly.logger.info("The upload of the batch was cancelled.")
+                return
+            except Exception as error:
+                metrics.registry.error(metrics.UPLOAD, metrics.get_error_class(error))
+                raise
+            finally:
+                # Delete the files of the batch as soon as possible to free the spool.
+                for image in batch:
+                    if isinstance(image.source, str):
+                        self.spool.remove(image.source)
+                    image.source = None
+            upload_time = time.monotonic() - upload_start
+            metrics.registry.observe(
+                metrics.UPLOAD,
+                upload_time,
+                uploaded_batch_images_number,
+                batch_bytes,
+            )
+            if self.tuner:
+                self.tuner.record_upload(uploaded_batch_images_number, upload_time)
+            if uploaded_batch_images_number:
+                # Save the uploaded images to the journal and the dataset index.
+                self.journal.add_uploaded(batch_names)
+                if self.dataset_index is not None:
+                    self.dataset_index.add(batch_names)
+
+                # Update the progress and the number of uploaded images.
+                self.uploaded_images_number += uploaded_batch_images_number
+                if progress_cb:
+                    progress_cb(uploaded_batch_images_number)
+
+    def get_summary(self) -> Dict:
+        """Returns the summary of the job for the result messages and reports.
+
+        Returns:
+            Dict: summary of the job
+        """
+        return {
+            "search_query": self.search_query,
+            "images_number": self.total_images_number,
+            "project_id": self.project_id,
+            "dataset_id": self.dataset_id,
+            "cancelled": not self.is_running(),
+            "api_errors": self.has_errors,
+            "error": self.error,
+            "found_images": self.found_images_number,
+            "uploaded_images": self.uploaded_images_number,
+            "resumed_images": len(self.resumed_ids),
+            "filtered_images": self.filtered_images,
+            index.BAD_LINKS: self.counters[index.BAD_LINKS],
+            index.BAD_EXTENSIONS: self.counters[index.BAD_EXTENSIONS],
+            index.DUPLICATES: self.counters[index.DUPLICATES],
+            index.BAD_FILES: self.counters[index.BAD_FILES],
+            index.EXISTED_DUPLICATES: self.counters[index.EXISTED_DUPLICATES],
+            index.WORKSPACE_DUPLICATES: self.counters[index.WORKSPACE_DUPLICATES],
+            "failed_downloads": {
+                index.get_pexels_id(name): cause
+                for name, cause in self.failed_downloads.items()
+            },
+            NEAR_DUPLICATES: self.counters[NEAR_DUPLICATES],
+            "queries": {
+                search_query: self.count_uploaded(search_query)
+                for search_query in self.search_queries
+            },
+            "shards": dict(self.found_by_shard),
+            "download_engine": self.download_engine,
+            "workers": self.get_workers(),
+            "batch_size": self.tuner.batch_size if self.tuner else self.batch_size,
+            "metrics": metrics.registry.summary(),
+        }
+
+    def get_workers(self) -> int:
+        """Returns the current number of concurrent downloads.
+
+        Returns:
+            int: number of workers of the download engine
+        """
+        if self.tuner:
+            return self.tuner.workers
+        if self.download_engine == "asyncio":
+            return g.ASYNC_DOWNLOAD_CONCURRENCY
+        return self.max_workers
+
+    def get_shards(self, search_query: str) -> List[Tuple[str, Dict[str, str]]]:
+        """Returns the shards of the search query for each combination of the values
+        of the shard filters, or the query itself if sharded search is disabled.
+
+        Args:
+            search_query (str): search query for images
+
+        Returns:
+            List[Tuple[str, Dict[str, str]]]: shard keys for the journal and search filters
+        """
+        if not self.shard_filters:
+            return [(search_query, {})]
+        shards = []
+        for values in itertools.product(
+            *(g.SHARD_FILTERS[name] for name in self.shard_filters)
+        ):
+            filters = dict(zip(self.shard_filters, values))
+            filters_text = ", ".join(f"{name}: {value}" for name, value in filters.items())
+            shards.append((f"{search_query} ({filters_text})", filters))
+        return shards
+
+    def count_uploaded(self, search_query: str) -> int:
+        """Counts the images uploaded by this run which were found by the search query
+        or its shards.
+
+        Args:
+            search_query (str): search query for images
+
+        Returns:
+            int: number of the uploaded images
+        """
+        return sum(
+            self.journal.count_uploaded(shard_key, self.resumed_ids)
+            for shard_key, _ in self.get_shards(search_query)
+        )
+
+    def fetch_page(
+        self,
+        search_query: str,
+        page_number: int,
+        filters: Optional[Dict[str, str]] = None,
+    ) -> Optional[List[Dict]]:
+        """Gets the page of the search results from the Pexels API.
+
+        Args:
+            search_query (str): search query for images
+            page_number (int): number of the page to get
+            filters (Optional[Dict[str, str]]): search filters of the shard
+
+        Returns:
+            Optional[List[Dict]]: list of images on the page or None if the page
+            was not received
+        """
+        sly.logger.debug(
+            f"Trying to get {g.IMAGES_PER_PAGE} images from page {page_number}. "
+            f"Search query: {search_query}."
+        )
+
+        params = {
+            "query": search_query,
+            "per_page": g.IMAGES_PER_PAGE,
+            "page": page_number,
+            **(filters or {}),
+        }
+
+        request_start = time.monotonic()
+        try:
+            response_data = pexels.search_page(
+                self.api_key, params, self.cancel_token
+            )
+        except pipeline.Cancelled:
+            sly.logger.debug(f"The request of the page {page_number} was cancelled.")
+            return
+        except requests.RequestException as error:
+            sly.logger.warn(
+                f"The request to the Pexels API failed with error: {error}."
+            )
+            metrics.registry.error(metrics.SEARCH, metrics.get_error_class(error))
+            response_data = None
+        else:
+            if response_data is None:
+                metrics.registry.error(metrics.SEARCH, "bad_response")
+
+        if response_data is None:
+            sly.logger.warn(
+                f"Pexels API did not answered correctly after {g.API_MAX_RETRIES} "
+                f"retries. Skipping the page {page_number}."
+            )
+            return
+
+        sly.logger.debug(
+            f"Pexels API response data. Page: {response_data.get('page')}. "
+            f"Per page: {response_data.get('per_page')}. "
+            f"Total results: {response_data.get('total_results')}."
+        )
+
+        images_on_page = response_data["photos"]
+        metrics.registry.observe(
+            metrics.SEARCH, time.monotonic() - request_start, len(images_on_page)
+        )
+
+        sly.logger.debug(
+            f"Pexels API returned {len(images_on_page)} images on page {page_number}. "
+        )
+        return images_on_page
+
+    def images_from_pexels(self) -> Iterator[Photo]:
+        """Searches for specified number of images on Pexels for each search query
+        and yields the records of the images with specified fields one by one, so
+        the next stages can start processing the images while the search is in progress.
+        The queries are searched concurrently and share the index of the found photos,
+        so the photo found by several queries is yielded only once.
+
+        Yields:
+            Iterator[Photo]: found image for using in the download_image()
+            and upload_images() methods
+        """
+        # Check if adding images to an existing dataset.
+        if self.dataset_id:
+            # Load the IDs of the existing photos to check for duplicates in search
+            # results, the dataset is listed only if the saved index is outdated.
+            sly.logger.debug(f"Dataset ID is not None: {self.dataset_id}.")
+            self.dataset_index = DatasetIndex.load(self.dataset_id)
+            # The copy isn't changed by the uploaded batches during the search.
+            existing_ids = set(self.dataset_index.ids)
+        else:
+            existing_ids = set()
+
+        if self.skip_workspace_duplicates:
+            # The photos from the other datasets are skipped instead of downloading again.
+            self.workspace_index = WorkspaceIndex.build(g.WORKSPACE_ID)
+
+        seen_ids = set()
+        if self.shard_filters:
+            shards = [
+                self.search_shard(
+                    search_query, shard_key, filters, seen_ids, existing_ids
+                )
+                for search_query in self.search_queries
+                for shard_key, filters in self.get_shards(search_query)
+            ]
+            # Shards are searched in parallel lanes, each lane searches its shards
+            # one by one, so the number of concurrent requests doesn't depend on
+            # the number of shards.
+            lanes_number = min(self.search_workers, len(shards))
+            searches = [
+                itertools.chain.from_iterable(shards[lane::lanes_number])
+                for lane in range(lanes_number)
+            ]
+        else:
+            searches = [
+                self.search_images(search_query, seen_ids, existing_ids)
+                for search_query in self.search_queries
+            ]
+        for order, image in enumerate(pipeline.merge(searches, self.is_running)):
+            image.order = order
+            yield image
+
+        for shard_key, found_number in self.found_by_shard.items():
+            sly.logger.info(f"Shard {shard_key} found {found_number} unique images.")
+
+        results_number = (
+            len(seen_ids)
+            + self.filtered_images
+            + self.counters[index.EXISTED_DUPLICATES]
+            + self.counters[index.WORKSPACE_DUPLICATES]
+        )
+
+        sly.logger.info(
+            f"Pexels API returned {results_number} images for {len(self.search_queries)} "
+            f"search queries with {self.images_number} images number."
+        )
+
+        sly.logger.info(
+            f"Skipped {self.filtered_images} number of bad results, where: "
+            f"{self.counters[index.BAD_LINKS]} is bad links, "
+            f"{self.counters[index.BAD_EXTENSIONS]} is bad extensions, "
+            f"{self.counters[index.DUPLICATES]} is duplicates."
+        )
+
+        sly.logger.debug(
+            f"Skipped {self.counters[index.EXISTED_DUPLICATES]} number of images "
+            "already existed in the dataset."
+        )
+        if self.skip_workspace_duplicates:
+            sly.logger.info(
+                f"Skipped {self.counters[index.WORKSPACE_DUPLICATES]} images "
+                "already existed in the other datasets of the workspace."
+            )
+
+        sly.logger.debug(f"Total number of results after filtering: {len(seen_ids)}.")
+
+    def search_images(
+        self, search_query: str, seen_ids: Set[int], existing_ids: Set[int]
+    ) -> Iterator[Photo]:
+        """Searches for specified number of images on Pexels using the search query
+        and yields filtered images one by one. Pages which are already in the journal
+        are not requested again and uploaded images are skipped.
+
+        Args:
+            search_query (str): search query for images
+            seen_ids (Set[int]): IDs of the photos found by all queries, updated in place
+            existing_ids (Set[int]): IDs of the photos which already exist in the dataset
+
+        Yields:
+            Iterator[Photo]: found image
+        """
+        (
+            start_page_number,
+            start_offset_number,
+            end_page_number,
+            end_offset_number,
+        ) = get_pages(self.images_number, self.start_number)
+
+        page_numbers = range(start_page_number, end_page_number + 1)
+        # Pages are fetched in parallel, but the results are processed in the page order,
+        # so the offsets and the order of images are the same as with sequential search.
+        pages = pipeline.ordered_map(
+            lambda page_number: None
+            if self.journal.has_page(search_query, page_number)
+            else self.fetch_page(search_query, page_number),
+            page_numbers,
+            self.search_workers,
+            self.is_running,
+        )
+        for page_number, images_on_page in zip(page_numbers, pages):
+            if self.journal.has_page(search_query, page_number):
+                # The page was fetched before the job was interrupted, skip uploaded images.
+                page_items = self.journal.get_page(search_query, page_number)
+                with self.lock:
+                    seen_ids.update(
+                        index.get_pexels_id(image.name) for image in page_items
+                    )
+                yield from self.get_resumed_images(page_items, existing_ids)
+                continue
+
+            if images_on_page is None:
+                if self.is_running():
+                    self.has_errors = True
+                continue
+
+            if page_number == start_page_number == end_page_number:
+                sly.logger.debug(
+                    f"Page number {page_number} is equal to start page number {start_page_number} "
+                    f"and end page number {end_page_number}. Slicing the result list of images "
+                    f"with {start_offset_number} and {end_offset_number} offsets."
+                )
+                images_on_page = images_on_page[start_offset_number:end_offset_number]
+
+            elif page_number == start_page_number:
+                # Slice the list of images on the first page according to the start offset.
+                sly.logger.debug(
+                    f"Page number {page_number} is equal to start page number {start_page_number}. Slicing the result "
+                    f"list of images with {start_offset_number} offset."
+                )
+                images_on_page = images_on_page[start_offset_number:]
+
+            elif page_number == end_page_number:
+                # Slice the list of images on the last page according to the end offset.
+                sly.logger.debug(
+                    f"Page number {page_number} is equal to end page number {end_page_number}. Slicing the result "
+                    f"list of images with {end_offset_number} offset."
+                )
+                images_on_page = images_on_page[:end_offset_number]
+
+            # Filter the images on the current page and save them to the journal.
+            # The index is shared by the queries, so the page is filtered under the lock.
+            with self.lock:
+                page_items = [
+                    Photo.from_search(
+                        name, self.get_link(link), image, self.metadata_fields
+                    )
+                    for name, link, image in index.filter_images(
+                        images_on_page,
+                        self.source_size,
+                        g.ALLOWED_IMAGE_FORMATS,
+                        seen_ids,
+                        existing_ids,
+                        self.counters,
+                        self.workspace_index,
+                    )
+                ]
+            self.journal.add_page(search_query, page_number, page_items)
+            yield from page_items
+
+    def search_shard(
+        self,
+        search_query: str,
+        shard_key: str,
+        filters: Dict[str, str],
+        seen_ids: Set[int],
+        existing_ids: Set[int],
+    ) -> Iterator[Photo]:
+        """Searches the images of the search query with the shard filters page by page
+        and yields filtered images one by one. The search stops when the shard has no more
+        results or the query has found the specified number of unique images.
+
+        Args:
+            search_query (str): search query for images
+            shard_key (str): key of the shard in the journal
+            filters (Dict[str, str]): search filters of the shard
+            seen_ids (Set[int]): IDs of the photos found by all shards, updated in place
+            existing_ids (Set[int]): IDs of the photos which already exist in the dataset
+
+        Yields:
+            Iterator[Photo]: found image
+        """
+        last_page_number = g.MAX_SEARCH_RESULTS // g.IMAGES_PER_PAGE
+        for page_number in range(1, last_page_number + 1):
+            if (
+                not self.is_running()
+                or self.found_by_query[search_query] >= self.images_number
+            ):
+                return
+
+            if self.journal.has_page(shard_key, page_number):
+                # The page was fetched before the job was interrupted, skip uploaded images.
+                page_items = self.journal.get_page(shard_key, page_number)
+                with self.lock:
+                    seen_ids.update(
+                        index.get_pexels_id(image.name) for image in page_items
+                    )
+                    self.found_by_query[search_query] += len(page_items)
+                    self.found_by_shard[shard_key] += len(page_items)
+                yield from self.get_resumed_images(page_items, existing_ids)
+                continue
+
+            images_on_page = self.fetch_page(search_query, page_number, filters)
+            if images_on_page is None:
+                if self.is_running():
+                    self.has_errors = True
+                return
+
+            # Filter the images on the current page, but not more than the query needs.
+            with self.lock:
+                remaining = self.images_number - self.found_by_query[search_query]
+                page_items = [
+                    Photo.from_search(
+                        name, self.get_link(link), image, self.metadata_fields
+                    )
+                    for name, link, image in itertools.islice(
+                        index.filter_images(
+                            images_on_page,
+                            self.source_size,
+                            g.ALLOWED_IMAGE_FORMATS,
+                            seen_ids,
+                            existing_ids,
+                            self.counters,
+                            self.workspace_index,
+                        ),
+                        max(remaining, 0),
+                    )
+                ]
+                self.found_by_query[search_query] += len(page_items)
+                self.found_by_shard[shard_key] += len(page_items)
+            self.journal.add_page(shard_key, page_number, page_items)
+            yield from page_items
+
+            if len(images_on_page) < g.IMAGES_PER_PAGE:
+                # The last page of the shard results.
+                return
+
+    def get_resumed_images(
+        self, page_items: List[Photo], existing_ids: Set[int]
+    ) -> List[Photo]:
+        """Returns the images of the page from the journal which still have to be
+        uploaded. The batch which was uploaded to the dataset before the job was
+        interrupted may be not marked in the journal, so its images are checked
+        in the dataset like the images of the fetched pages.
+
+        Args:
+            page_items (List[Photo]): images of the page from the journal
+            existing_ids (Set[int]): IDs of the photos which already exist in the dataset
+
+        Returns:
+            List[Photo]: images which are not uploaded yet
+        """
+        images = []
+        for image in page_items:
+            if self.journal.is_uploaded(image.name):
+                continue
+            if index.get_pexels_id(image.name) in existing_ids:
+                with self.lock:
+                    self.counters[index.EXISTED_DUPLICATES] += 1
+                sly.logger.debug(
+                    f"Image with name {image.name} is skipped because it already "
+                    "exists in the dataset."
+                )
+                continue
+            images.append(image)
+        return images
+
+    def download_images(
+        self, in_queue: queue.Queue, out_queue: queue.Queue
+    ) -> threading.Thread:
+        """Starts the stage which downloads the images from the input queue to the local
+        temporary directory in parallel and puts the downloaded images into the output queue.
+
+        Args:
+            in_queue (queue.Queue): queue with names, global links and metadata of the images
+            out_queue (queue.Queue): queue for names, local paths or contents and metadata
+                of the images for using in the upload_images_to_dataset() method
+
+        Returns:
+            threading.Thread: started thread of the download stage
+        """
+        # Creating the temporary directory for images.
+        os.makedirs(self.spool.directory, exist_ok=True)
+
+        if self.download_engine == "asyncio":
+            # All downloads run on one event loop with the global concurrency limit,
+            # which is adjusted by the tuner if auto-tuning is enabled.
+            concurrency = g.ASYNC_DOWNLOAD_CONCURRENCY
+            if self.tuner:
+                concurrency = lambda: self.tuner.workers
+            return pipeline.map_async(
+                self.download_image_async,
+                in_queue,
+                out_queue,
+                concurrency,
+                self.is_running,
+                lambda: pexels.create_async_session(g.ASYNC_DOWNLOAD_CONCURRENCY),
+            )
+
+        if self.tuner:
+            # The pool has the maximum size and the tuner limits the active downloads.
+            return pipeline.map_concurrently(
+                self.download_image,
+                in_queue,
+                out_queue,
+                self.tuner.max_workers,
+                self.is_running,
+                self.tuner.limiter,
+            )
+        return pipeline.map_concurrently(
+            self.download_image, in_queue, out_queue, self.max_workers, self.is_running
+        )
+
+    def download_image(self, image: Photo) -> Optional[Photo]:
+        """Downloads the image with specified link to the local temporary directory.
+        The transient errors are retried with exponential backoff and jitter.
+
+        Args:
+            image (Photo): found image
+
+        Returns:
+            Optional[Photo]: the image with the local path or content
+            if it was downloaded successfully, None otherwise
+        """
+        for attempt in itertools.count():
+            try:
+                return self.attempt_download(image)
+            except Exception as error:
+                delay = self.get_retry_delay(image, attempt, error)
+                if delay is None:
+                    return
+            try:
+                pexels.sleep(delay, self.cancel_token)
+            except pipeline.Cancelled:
+                return
+
+    def attempt_download(self, image: Photo) -> Photo:
+        """Makes one attempt to download the image to the local temporary directory.
+        If uploading from memory is enabled and the image fits into the memory budget,
+        the image is kept in memory instead of saving it to disk.
+
+        Args:
+            image (Photo): found image
+
+        Raises:
+            Exception: if the download failed, the partial file is already removed
+
+        Returns:
+            Photo: the image with the local path or content
+        """
+        name, link = image.name, image.link
+
+        # Creating path for image to download.
+        local_link = self.spool.get_path(name)
+        reserved_size = 0
+        download_start = time.monotonic()
+
+        try:
+            self.cancel_token.check()
+            # Waiting for the free space in the spool before sending the request.
+            self.spool.reserve(
+                local_link, self.spool.estimate_size(), self.cancel_token
+            )
+            with pexels.get(link, stream=True) as response:
+                response.raise_for_status()
+
+                # Rejecting the image before downloading if the server announced its size.
+                expected_size = get_expected_size(name, response.headers)
+
+                if expected_size and self.memory_budget.reserve(expected_size):
+                    # Keeping the image in memory if it fits into the memory budget.
+                    self.spool.remove(local_link)
+                    reserved_size = expected_size
+                    content = bytearray()
+                    filesize = read_chunks(
+                        name, response, content.extend, self.cancel_token
+                    )
+                    if filesize != expected_size:
+                        raise IncompleteDownload(
+                            f"Image {name} was not downloaded completely."
+                        )
+                    local_link = bytes(content)
+                else:
+                    # Writing the image to the local temporary directory by chunks,
+                    # so only one chunk per worker is kept in memory.
+                    if expected_size:
+                        self.spool.resize(local_link, expected_size)
+                    with open(local_link, "wb") as fo:
+                        filesize = read_chunks(
+                            name, response, fo.write, self.cancel_token
+                        )
+                    self.spool.resize(local_link, filesize, downloaded=True)
+                    if expected_size and filesize != expected_size:
+                        raise IncompleteDownload(
+                            f"Image {name} was not downloaded completely."
+                        )
+
+            return self.finish_download(image, local_link, filesize, download_start)
+        except Exception as error:
+            self.fail_download(name, local_link, reserved_size, error)
+            raise
+
+    async def download_image_async(
+        self,
+        session: "pexels.aiohttp.ClientSession",
+        image: Photo,
+    ) -> Optional[Photo]:
+        """Downloads the image like the download_image() method, but on the event loop
+        of the asyncio download engine.
+
+        Args:
+            session (aiohttp.ClientSession): HTTP session of the download stage
+            image (Photo): found image
+
+        Returns:
+            Optional[Photo]: the image with the local path or content
+            if it was downloaded successfully, None otherwise
+        """
+        for attempt in itertools.count():
+            try:
+                return await self.attempt_download_async(session, image)
+            except Exception as error:
+                delay = self.get_retry_delay(image, attempt, error)
+                if delay is None:
+                    return
+            # The task is cancelled by the stage while sleeping if the job is cancelled.
+            await asyncio.sleep(delay)
+
+    async def attempt_download_async(
+        self,
+        session: "pexels.aiohttp.ClientSession",
+        image: Photo,
+    ) -> Photo:
+        """Makes one attempt to download the image like the attempt_download() method,
+        but on the event loop of the asyncio download engine.
+
+        Args:
+            session (aiohttp.ClientSession): HTTP session of the download stage
+            image (Photo): found image
+
+        Raises:
+            Exception: if the download failed, the partial file is already removed
+
+        Returns:
+            Photo: the image with the local path or content
+        """
+        name, link = image.name, image.link
+
+        # Creating path for image to download.
+        local_link = self.spool.get_path(name)
+        reserved_size = 0
+        download_start = time.monotonic()
+
+        try:
+            self.cancel_token.check()
+            # Waiting for the free space in the spool before sending the request.
+            await self.spool.reserve_async(
+                local_link, self.spool.estimate_size(), self.cancel_token
+            )
+            async with session.get(link) as response:
+                response.raise_for_status()
+
+                # Rejecting the image before downloading if the server announced its size.
+                expected_size = get_expected_size(name, response.headers)
+
+                if expected_size and self.memory_budget.reserve(expected_size):
+                    # Keeping the image in memory if it fits into the memory budget.
+                    self.spool.remove(local_link)
+                    reserved_size = expected_size
+                    content = bytearray()
+                    filesize = await read_chunks_async(
+                        name, response, content.extend, self.cancel_token
+                    )
+                    if filesize != expected_size:
+                        raise IncompleteDownload(
+                            f"Image {name} was not downloaded completely."
+                        )
+                    local_link = bytes(content)
+                else:
+                    # Writing the chunks to the page cache is fast enough to do it
+                    # on the event loop.
+                    if expected_size:
+                        self.spool.resize(local_link, expected_size)
+                    with open(local_link, "wb") as fo:
+                        filesize = await read_chunks_async(
+                            name, response, fo.write, self.cancel_token
+                        )
+                    self.spool.resize(local_link, filesize, downloaded=True)
+                    if expected_size and filesize != expected_size:
+                        raise IncompleteDownload(
+                            f"Image {name} was not downloaded completely."
+                        )
+
+            # Decoding the thumbnail is CPU bound, so it runs in the default executor.
+            return await asyncio.get_running_loop().run_in_executor(
+                None,
+                self.finish_download,
+                image,
+                local_link,
+                filesize,
+                download_start,
+            )
+        except Exception as error:
+            self.fail_download(name, local_link, reserved_size, error)
+            raise
+        except asyncio.CancelledError:
+            # The task is cancelled by the stage when the job is cancelled.
+            self.fail_download(
+                name, local_link, reserved_size, pipeline.Cancelled("Task cancelled.")
+            )
+            raise
+
+    def finish_download(
+        self,
+        image: Photo,
+        local_link: Union[str, bytes],
+        filesize: int,
+        download_start: float,
+    ) -> Photo:
+        """Checks the downloaded image and records the download. Used by both download
+        engines after the image is read from the response.
+
+        Args:
+            image (Photo): downloaded image
+            local_link (Union[str, bytes]): local path or content of the image
+            filesize (int): size of the image in bytes
+            download_start (float): monotonic time when the download was started
+
+        Raises:
+            Exception: if the size of the image is not within the allowed limits
+
+        Returns:
+            Photo: the image with the local path or content
+        """
+        name = image.name
+        check_file_size(name, filesize)
+        metrics.registry.observe(
+            metrics.DOWNLOAD, time.monotonic() - download_start, size=filesize
+        )
+
+        if self.hash_index is not None:
+            # Decoding the downscaled image in the worker for near-duplicates check.
+            image.thumbnail = phash.get_thumbnail(local_link)
+
+        sly.logger.debug(f"Image {name} downloaded successfully.")
+        if self.tuner:
+            self.tuner.record_download(True)
+        image.source = local_link
+        return image
+
+    def fail_download(
+        self,
+        name: str,
+        local_link: Union[str, bytes],
+        reserved_size: int,
+        error: Exception,
+    ):
+        """Records the failed download attempt and frees its memory and disk space.
+
+        Args:
+            name (str): name of the image
+            local_link (Union[str, bytes]): local path or content of the image
+            reserved_size (int): size reserved in the memory budget for the image
+            error (Exception): error of the download
+        """
+        self.memory_budget.release(reserved_size)
+        if isinstance(error, pipeline.Cancelled):
+            sly.logger.debug(f"The download of the image {name} was cancelled.")
+        else:
+            sly.logger.warning(
+                f"There was an error while downloading the image {name}: {error}."
+            )
+            metrics.registry.error(metrics.DOWNLOAD, metrics.get_error_class(error))
+            if self.tuner:
+                self.tuner.record_download(False)
+        # Removing the partially downloaded or rejected file.
+        if isinstance(local_link, str):
+            self.spool.remove(local_link)
+
+    def get_retry_delay(
+        self, image: Photo, attempt: int, error: Exception
+    ) -> Optional[float]:
+        """Decides if the failed download attempt is retried. The image which is not
+        retried is recorded as failed and requeued after the other images if the error
+        is transient.
+
+        Args:
+            image (Photo): found image
+            attempt (int): number of the failed attempt, starting from 0
+            error (Exception): error of the attempt
+
+        Returns:
+            Optional[float]: delay before the next attempt in seconds or None if
+            the image is not retried
+        """
+        name = image.name
+        if isinstance(error, pipeline.Cancelled) or not self.is_running():
+            return
+        transient = is_transient_error(error)
+        if transient and attempt < g.DOWNLOAD_MAX_RETRIES:
+            return pexels.get_backoff_delay(
+                attempt, {}, g.DOWNLOAD_BACKOFF_BASE, g.DOWNLOAD_BACKOFF_MAX
+            )
+
+        sly.logger.error(
+            f"The image {name} was not downloaded after {attempt + 1} attempts: {error}."
+        )
+        with self.lock:
+            self.failed_downloads[name] = f"{metrics.get_error_class(error)}: {error}"
+            if transient:
+                self.requeued_downloads.append(image)
+
+    def upload_images_to_dataset(
+        self,
+        batch_names: List[str],
+        batch_links: List[Union[str, bytes]],
+        batch_metas: List[Dict[str, str]],
+    ) -> int:
+        """Adds images to the dataset using the list of names, links and metadata.
+
+        Args:
+            batch_names (List[str]): list with images filenames
+            batch_links (List[Union[str, bytes]]): list with images links, local paths
+                or contents
+            batch_metas (List[Dict[str, str]]): list with images metadata
+
+        Returns:
+            int: the number of uploaded images
+        """
+        sly.logger.debug(
+            f"Starting to upload {len(batch_names)} images to dataset {self.dataset_id} "
+            f"with {self.upload_method} upload method."
+        )
+        # Check if the job wasn't cancelled.
+        if not self.is_running():
+            return 0
+
+        if self.upload_method == "links":
+            uploaded_images = g.api.image.upload_links(
+                self.dataset_id,
+                batch_names,
+                batch_links,
+                progress_cb=self.cancel_token.check,
+                metas=batch_metas,
+            )
+
+        elif self.upload_method == "files":
+            uploaded_images = []
+            # Images are either saved to the temporary directory or kept in memory.
+            paths = [i for i, link in enumerate(batch_links) if isinstance(link, str)]
+            contents = [
+                i for i, link in enumerate(batch_links) if isinstance(link, bytes)
+            ]
+            if paths:
+                uploaded_images += g.api.image.upload_paths(
+                    self.dataset_id,
+                    [batch_names[i] for i in paths],
+                    [batch_links[i] for i in paths],
+                    progress_cb=self.cancel_token.check,
+                    metas=[batch_metas[i] for i in paths],
+                )
+            if contents:
+                uploaded_images += self.upload_contents(
+                    [batch_names[i] for i in contents],
+                    [batch_links[i] for i in contents],
+                    [batch_metas[i] for i in contents],
+                )
+
+        sly.logger.debug(
+            f"Finished uploading batch with {len(uploaded_images)} images "
+            f"to dataset {self.dataset_id}."
+        )
+
+        return len(uploaded_images)
+
+    def upload_contents(
+        self,
+        names: List[str],
+        contents: List[bytes],
+        metas: List[Dict[str, str]],
+    ) -> List[sly.ImageInfo]:
+        """Uploads the images from memory to the dataset without saving them to disk
+        and releases their memory budget.
+
+        Args:
+            names (List[str]): list with images filenames
+            contents (List[bytes]): list with images contents
+            metas (List[Dict[str, str]]): list with images metadata
+
+        Returns:
+            List[sly.ImageInfo]: list with uploaded images infos
+        """
+        try:
+            if not hasattr(g.api.image, "_upload_data_bulk"):
+                # The SDK has changed, so the images are decoded and encoded again
+                # by the public method instead of failing the job.
+                return g.api.image.upload_nps(
+                    self.dataset_id,
+                    names,
+                    [sly.image.read_bytes(content) for content in contents],
+                    progress_cb=self.cancel_token.check,
+                    metas=metas,
+                )
+            # The SDK has no public method which uploads the encoded images from memory:
+            # upload_paths() reads the files from disk and upload_nps() encodes the images
+            # again, which loses the quality of JPEGs and takes the time saved by the
+            # in-memory mode. So the contents are uploaded by hashes with the private
+            # method, which upload_paths() and upload_nps() use themselves. The SDK
+            # version is pinned in dev_requirements.txt and by the docker image
+            # in config.json, check this call when updating it.
+            hashes = [get_bytes_hash(content) for content in contents]
+            g.api.image._upload_data_bulk(
+                lambda content: content,
+                zip(contents, hashes),
+                progress_cb=self.cancel_token.check,
+            )
+            return g.api.image.upload_hashes(
+                self.dataset_id,
+                names,
+                hashes,
+                progress_cb=self.cancel_token.check,
+                metas=metas,
+            )
+        finally:
+            self.memory_budget.release(sum(len(content) for content in contents))
+
+    def validate_image(self, image: Photo) -> Optional[Photo]:
+        """Checks the signature and the header of the downloaded image and rejects
+        the files which are not valid images, e.g. HTML error pages.
+
+        Args:
+            image (Photo): downloaded image
+
+        Returns:
+            Optional[Photo]: the same image if it's valid, None otherwise
+        """
+        name, local_link = image.name, image.source
+        validation_start = time.monotonic()
+        try:
+            image_format, width, height = validation.validate_image(name, local_link)
+        except validation.ValidationError as error:
+            sly.logger.warning(f"Image {name} is rejected: {error}")
+            metrics.registry.error(metrics.VALIDATION, error.reason)
+            with self.lock:
+                self.counters[index.BAD_FILES] += 1
+            image.thumbnail = image.source = None
+            if isinstance(local_link, bytes):
+                self.memory_budget.release(len(local_link))
+            else:
+                self.spool.remove(local_link)
+            return
+        metrics.registry.observe(
+            metrics.VALIDATION, time.monotonic() - validation_start
+        )
+        sly.logger.debug(f"Image {name} is valid {image_format} {width}x{height}.")
+        return image
+
+    def build_hash_index(self) -> phash.HashIndex:
+        """Builds the index of perceptual hashes of the images in the dataset,
+        which were saved in the images metadata when uploading.
+
+        Returns:
+            phash.HashIndex: index of the perceptual hashes
+        """
+        hex_hashes = []
+        if self.dataset_id:
+            for image in g.api.image.get_list(self.dataset_id):
+                hex_hash = (image.meta or {}).get(g.PHASH_METADATA_KEY)
+                if hex_hash:
+                    hex_hashes.append(hex_hash)
+        sly.logger.debug(f"Read {len(hex_hashes)} perceptual hashes from the dataset.")
+        return phash.HashIndex(g.NEAR_DUPLICATE_THRESHOLD, hex_hashes)
+
+    def remove_near_duplicates(self, batch: List[Photo]) -> List[Photo]:
+        """Computes perceptual hashes for the whole batch, removes the images which are
+        near-duplicates of the dataset images and adds the hashes of the rest to the index
+        and to their metadata.
+
+        Args:
+            batch (List[Photo]): downloaded images
+
+        Returns:
+            List[Photo]: batch without near-duplicates
+        """
+        # Images which couldn't be decoded are not checked.
+        hashed = [image for image in batch if image.thumbnail is not None]
+        hashes = phash.compute_hashes([image.thumbnail for image in hashed])
+        is_duplicate = self.hash_index.find_duplicates(hashes)
+
+        removed = set()
+        for image, image_hash, duplicate in zip(hashed, hashes, is_duplicate):
+            if duplicate:
+                removed.add(image.name)
+                # Releasing the memory or the disk space of the skipped image.
+                if isinstance(image.source, bytes):
+                    self.memory_budget.release(len(image.source))
+                else:
+                    self.spool.remove(image.source)
+                image.source = None
+                sly.logger.debug(f"Image {image.name} is skipped as a near-duplicate.")
+            else:
+                image.phash = phash.to_hex(image_hash)
+
+        self.hash_index.add(hashes[~is_duplicate])
+        self.counters[NEAR_DUPLICATES] += len(removed)
+        for image in batch:
+            image.thumbnail = None
+        return [image for image in batch if image.name not in removed]
+
+    def update_custom_data(self):
+        """Adds the information about the job to the custom data of the project."""
+        # Preparing defaultdict for custom_data from project.
+        custom_data = defaultdict(dict)
+
+        # Update the custom_data with the data from the project.
+        custom_data.update(g.api.project.get_info_by_id(self.project_id).custom_data)
+
+        dataset_name = g.api.dataset.get_info_by_id(self.dataset_id).name
+        now = datetime.now().strftime("%Y/%m/%d %H:%M:%S")
+
+        # Adding app search results to the custom_data of the project for each query,
+        # the images found by several queries are counted for the first one.
+        for search_query in self.search_queries:
+            search_query_dict = custom_data[g.CUSTOM_DATA_KEY].get(search_query, {})
+            search_query_dict.update(
+                {
+                    now: {
+                        "Dataset name": dataset_name,
+                        "Upload method": f"uploaded as {self.upload_method}",
+                        "Search images offset": self.start_number,
+                        "Number of images": self.count_uploaded(search_query),
+                    }
+                }
+            )
+
+            # Updating custom_data with the new data.
+            custom_data[g.CUSTOM_DATA_KEY][search_query] = search_query_dict
+        g.api.project.update_custom_data(self.project_id, dict(custom_data))
+
+
+def get_batch_size_in_bytes(
+    batch_links: List[Union[str, bytes]], upload_method: str
+) -> int:
+    """Returns the total size of the downloaded images in the batch.
+
+    Args:
+        batch_links (List[Union[str, bytes]]): images links, local paths or contents
+        upload_method (str): the method to upload images to the dataset
+
+    Returns:
+        int: size in bytes, zero if the images are uploaded as links
+    """
+    if upload_method != "files":
+        return 0
+    return sum(
+        len(link) if isinstance(link, bytes) else os.path.getsize(link)
+        for link in batch_links
+    )
+
+
+def get_search_queries(search_query: Union[str, List[str]]) -> List[str]:
+    """Splits the search query into the list of unique search queries.
+
+    Args:
+        search_query (Union[str, List[str]]): queries separated with g.QUERY_SEPARATOR
+            or the list of queries
+
+    Returns:
+        List[str]: list of unique non-empty queries in the original order
+    """
+    if isinstance(search_query, str):
+        search_query = search_query.split(g.QUERY_SEPARATOR)
+    queries = [query.strip() for query in search_query]
+    return list(dict.fromkeys(query for query in queries if query))
+
+
+def get_pages(images_number: int, start_number: int) -> Tuple[int, int, int, int]:
+    """Calculates the numbers of start and end pages of the search and their offsets.
+
+    Args:
+        images_number (int): number of images to search
+        start_number (int): number of images to skip from the beginning of the search
+
+    Returns:
+        Tuple[int, int, int, int]: start page number, start offset, end page number
+        and end offset
+    """
+    total_images_number = images_number + start_number
+
+    start_page_number = start_number // g.IMAGES_PER_PAGE + 1
+    start_offset_number = start_number % g.IMAGES_PER_PAGE
+
+    end_page_number = total_images_number // g.IMAGES_PER_PAGE + 1
+    end_offset_number = (
+        images_number - (g.IMAGES_PER_PAGE - start_offset_number)
+    ) % g.IMAGES_PER_PAGE
+
+    sly.logger.debug(
+        f"Total images number (with offset): {total_images_number}. "
+        f"Start page: {start_page_number}, start offset: {start_offset_number}. "
+        f"End page: {end_page_number}, end offset: {end_offset_number}."
+    )
+    return start_page_number, start_offset_number, end_page_number, end_offset_number
+
+
+def read_chunks(
+    name: str,
+    response: requests.Response,
+    write: Callable[[bytes], Any],
+    cancel_token: Optional[pipeline.CancellationToken] = None,
+) -> int:
+    """Reads the response content by chunks and passes them to the write function.
+    Stops reading as soon as the image exceeds the maximum file size
+    or the job is cancelled.
+
+    Args:
+        name (str): name of the image
+        response (requests.Response): streamed response with the image
+        write (Callable[[bytes], Any]): function which stores the chunk
+        cancel_token (Optional[pipeline.CancellationToken]): cancellation token of the job
+
+    Raises:
+        pipeline.Cancelled: if the job was cancelled during the download
+
+    Returns:
+        int: number of read bytes
+    """
+    filesize = 0
+    for chunk in response.iter_content(chunk_size=g.DOWNLOAD_CHUNK_SIZE):
+        if cancel_token is not None:
+            cancel_token.check()
+        filesize += len(chunk)
+        if filesize > g.MAX_FILE_SIZE:
+            check_file_size(name, filesize)
+        write(chunk)
+    return filesize
+
+
+async def read_chunks_async(
+    name: str,
+    response: "pexels.aiohttp.ClientResponse",
+    write: Callable[[bytes], Any],
+    cancel_token: Optional[pipeline.CancellationToken] = None,
+) -> int:
+    """Reads the response content by chunks like read_chunks() for the asyncio
+    download engine.
+
+    Args:
+        name (str): name of the image
+        response (aiohttp.ClientResponse): response with the image
+        write (Callable[[bytes], Any]): function which stores the chunk
+        cancel_token (Optional[pipeline.CancellationToken]): cancellation token of the job
+
+    Returns:
+        int: number of read bytes
+    """
+    filesize = 0
+    async for chunk in response.content.iter_chunked(g.DOWNLOAD_CHUNK_SIZE):
+        if cancel_token is not None:
+            cancel_token.check()
+        filesize += len(chunk)
+        if filesize > g.MAX_FILE_SIZE:
+            check_file_size(name, filesize)
+        write(chunk)
+    return filesize
+
+
+def get_expected_size(name: str, headers: Mapping[str, str]) -> Optional[int]:
+    """Returns the size of the image announced by the server and rejects the image
+    before downloading if the size is not within the allowed limits.
+
+    Args:
+        name (str): name of the image
+        headers (Mapping[str, str]): headers of the response with the image
+
+    Raises:
+        Exception: if the size of the image is not within the allowed limits
+
+    Returns:
+        Optional[int]: size of the image in bytes or None if it's unknown
+    """
+    content_length = headers.get("Content-Length")
+    if not content_length or not content_length.isdigit():
+        return
+    expected_size = int(content_length)
+    check_file_size(name, expected_size)
+    return expected_size
+
+
+class IncompleteDownload(Exception):
+    """Raised if the response with the image ended before its announced size."""
+
+
+def is_transient_error(error: Exception) -> bool:
+    """Checks if the failed download may succeed when retried: the connection errors,
+    timeouts, interrupted responses and the HTTP statuses from RETRY_STATUS_CODES.
+
+    Args:
+        error (Exception): error of the download
+
+    Returns:
+        bool: True if the download should be retried
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in g.RETRY_STATUS_CODES
+    transient_errors = (
+        IncompleteDownload,
+        requests.ConnectionError,
+        requests.Timeout,
+        requests.exceptions.ChunkedEncodingError,
+        asyncio.TimeoutError,
+        ConnectionError,
+    )
+    if pexels.aiohttp is not None:
+        transient_errors += (
+            pexels.aiohttp.ClientConnectionError,
+            pexels.aiohttp.ClientPayloadError,
+        )
+    return isinstance(error, transient_errors)
+
+
+def check_file_size(name: str, filesize: int):
+    """Checks if the size of the image is within the allowed limits.
+
+    Args:
+        name (str): name of the image
+        filesize (int): size of the image in bytes
+
+    Raises:
+        Exception: if the image is too small or too large
+    """
+    if filesize < g.MIN_FILE_SIZE:
+        sly.logger.warning(
+            f"Image {name} is too small ({filesize} bytes) and might be corrupted. Skipping..."
+        )
+        raise Exception("Image is too small, probably corrupted.")
+    if filesize > g.MAX_FILE_SIZE:
+        sly.logger.warning(
+            f"Image {name} is too large ({filesize} bytes), the limit is "
+            f"{g.MAX_FILE_SIZE} bytes. Skipping..."
+        )
+        raise Exception("Image is too large.")
+
+
+def create_project(project_name: Optional[str], search_query: str) -> int:
+    """Create the project with the specified name and return its id.
+    If the name is not specified, use the search query as the name.
+
+    Args:
+        project_name (Optional[str]): name of the project to create
+        search_query (str): search query to generate the name
+
+    Returns:
+        int: id of the created project
+    """
+    # If the name is not specified, use the search query as the name.
+    if not project_name:
+        sly.logger.debug("Project name is not specified, using search query.")
+        project_name = f"Pexels images: {search_query}"
+
+    project = g.api.project.create(
+        g.WORKSPACE_ID, project_name, change_name_if_conflict=True
+    )
+    return project.id
+
+
+def create_dataset(
+    project_id: int, dataset_name: Optional[str], search_query: str
+) -> int:
+    """Create the dataset with the specified name and return its id.
+    If the name is not specified, use the search query as the name.
+
+    Args:
+        project_id (int): id of the project to create the dataset in
+        dataset_name (Optional[str]): name of the dataset to create
+        search_query (str): search query to generate the name
+
+    Returns:
+        int: id of the created dataset
+    """
+    # If the name is not specified, use the search query as the name.
+    if not dataset_name:
+        now = datetime.now().strftime("%Y-%m-%d %H:%M")
+        sly.logger.debug("Dataset name is not specified, using search query.")
+        dataset_name = f"{now} ({search_query})"
+
+    dataset = g.api.dataset.create(
+        project_id, dataset_name, change_name_if_conflict=True
+    )
+    return dataset.id
@@ -16,16 +16,152 @@ WORKSPACE_ID = sly.io.env.workspace_id()
 
 SLY_APP_DATA_DIR = sly.app.get_data_dir()
 IMAGES_TMP_DIR = "images"
+# Spool for the downloaded images: directory, maximum total size of the files
+# and the size reserved for the image before the actual sizes are known.
+SPOOL_DIR = os.path.join(SLY_APP_DATA_DIR, IMAGES_TMP_DIR)
+SPOOL_SIZE = int(os.getenv("PEXELS_SPOOL_SIZE", 4096)) * 1024 * 1024  # 4 GB
+SPOOL_DEFAULT_FILE_SIZE = 2 * 1024 * 1024  # 2 MB
 CUSTOM_DATA_KEY = "Pexels downloader"
 
-PEXELS_API_URL = "https://api.pexels.com/v1/search"
+PEXELS_API_URL = os.getenv("PEXELS_API_URL", "https://api.pexels.com/v1/search")
 
 MIN_FILE_SIZE = 1 * 1024  # 1 KB
+MAX_FILE_SIZE = int(os.getenv("PEXELS_MAX_FILE_SIZE", 100)) * 1024 * 1024  # 100 MB
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # 64 KB
+# Maximum size of the downloaded images kept in memory when uploading without disk,
+# images which don't fit into it are saved to the temporary directory.
+MEMORY_BUDGET = int(os.getenv("PEXELS_MEMORY_BUDGET", 512)) * 1024 * 1024  # 512 MB
+
+# Settings for the shared HTTP session: timeouts in seconds and connection pool sizes.
+CONNECT_TIMEOUT = float(os.getenv("PEXELS_CONNECT_TIMEOUT", 10))
+READ_TIMEOUT = float(os.getenv("PEXELS_READ_TIMEOUT", 60))
+# Number of hosts to keep pools for: Pexels API and images CDN.
+POOL_CONNECTIONS = 2
+DEFAULT_POOL_SIZE = os.cpu_count()
+
+# Number of workers which check the downloaded files before uploading.
+VALIDATION_WORKERS = int(os.getenv("PEXELS_VALIDATION_WORKERS", os.cpu_count()))
+
+# Engines for downloading the images: threads with blocking requests or one asyncio
+# event loop, and the global limit of the concurrent downloads of the asyncio engine.
+DOWNLOAD_ENGINES = {
+    "threads": "Thread pool (one thread per concurrent download)",
+    "asyncio": "Asyncio event loop (hundreds of concurrent downloads)",
+}
+DEFAULT_DOWNLOAD_ENGINE = os.getenv("PEXELS_DOWNLOAD_ENGINE", "threads")
+ASYNC_DOWNLOAD_CONCURRENCY = int(os.getenv("PEXELS_ASYNC_DOWNLOAD_CONCURRENCY", 256))
+
+# Settings for the Pexels API requests scheduler: token bucket rate (requests per second)
+# and capacity (maximum burst), retries with exponential backoff for throttled requests.
+API_REQUESTS_PER_SECOND = float(os.getenv("PEXELS_REQUESTS_PER_SECOND", 1))
+API_BURST_SIZE = int(os.getenv("PEXELS_BURST_SIZE", 5))
+API_MAX_RETRIES = 5
+API_BACKOFF_BASE = 2  # seconds
+API_BACKOFF_MAX = 60  # seconds
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# Query of the search for one image, which requests the remaining quota before the job.
+QUOTA_CHECK_QUERY = "nature"
+# Retries of the failed image downloads with exponential backoff and the number of rounds
+# which requeue the images failed all retries after the other images of the job.
+DOWNLOAD_MAX_RETRIES = int(os.getenv("PEXELS_DOWNLOAD_MAX_RETRIES", 3))
+DOWNLOAD_BACKOFF_BASE = 1  # seconds
+DOWNLOAD_BACKOFF_MAX = 10  # seconds
+DOWNLOAD_REQUEUE_ROUNDS = int(os.getenv("PEXELS_DOWNLOAD_REQUEUE_ROUNDS", 1))
+# Default number of search result pages to fetch in parallel.
+SEARCH_WORKERS = 4
+
+# Bounds and parameters for automatic tuning of the number of download workers
+# and the upload batch size from the measured throughput.
+AUTO_TUNE_MIN_WORKERS = int(os.getenv("PEXELS_AUTO_TUNE_MIN_WORKERS", 2))
+AUTO_TUNE_MAX_WORKERS = int(os.getenv("PEXELS_AUTO_TUNE_MAX_WORKERS", 32))
+AUTO_TUNE_MIN_BATCH_SIZE = int(os.getenv("PEXELS_AUTO_TUNE_MIN_BATCH_SIZE", 50))
+AUTO_TUNE_MAX_BATCH_SIZE = int(os.getenv("PEXELS_AUTO_TUNE_MAX_BATCH_SIZE", 1000))
+AUTO_TUNE_INTERVAL = 5  # seconds between adjustments of the number of workers
+AUTO_TUNE_TOLERANCE = 0.05  # relative throughput change treated as noise
+AUTO_TUNE_MAX_ERROR_RATE = 0.1  # share of failed downloads to reduce the workers
+AUTO_TUNE_BATCH_SECONDS = 15  # target duration of uploading one batch
+
+# Settings for the persistent cache of the search results.
+SEARCH_CACHE_PATH = os.getenv(
+    "PEXELS_CACHE_PATH", os.path.join(SLY_APP_DATA_DIR, "cache", "search.db")
+)
+SEARCH_CACHE_TTL = int(os.getenv("PEXELS_CACHE_TTL", 60 * 60))  # seconds
+SEARCH_CACHE_MAX_SIZE = int(os.getenv("PEXELS_CACHE_MAX_SIZE", 256)) * 1024 * 1024
+
+# Directories for the indexes of the Pexels photo IDs of the datasets in the app data
+# and in the team files.
+DATASET_INDEX_LOCAL_DIR = os.path.join(SLY_APP_DATA_DIR, "index")
+DATASET_INDEX_REMOTE_DIR = "/pexels-downloader/index"
+
+# Paths to the journal of the unfinished job in the app data and in the team files
+# and the minimum interval between the uploads of the journal to the team files.
+JOURNAL_LOCAL_PATH = os.path.join(SLY_APP_DATA_DIR, "journal", "journal.jsonl")
+JOURNAL_REMOTE_PATH = f"/pexels-downloader/journal_{WORKSPACE_ID}.jsonl"
+JOURNAL_UPLOAD_INTERVAL = float(os.getenv("PEXELS_JOURNAL_UPLOAD_INTERVAL", 30))
 
 # Settings for images search and metadata fields.
 IMAGES_PER_PAGE = 80
+# Separator of several search queries in one job.
+QUERY_SEPARATOR = ","
+# Pexels API returns at most this number of results for one search query.
+MAX_SEARCH_RESULTS = 8000
+# Values of the search filters for splitting one query into shards with sharded search,
+# each shard is a separate search with its own limit of results.
+SHARD_FILTERS = {
+    "orientation": ["landscape", "portrait", "square"],
+    "size": ["large", "medium", "small"],
+    "color": [
+        "red",
+        "orange",
+        "yellow",
+        "green",
+        "turquoise",
+        "blue",
+        "violet",
+        "pink",
+        "brown",
+        "black",
+        "gray",
+        "white",
+    ],
+    "locale": [
+        "en-US",
+        "pt-BR",
+        "es-ES",
+        "ca-ES",
+        "de-DE",
+        "it-IT",
+        "fr-FR",
+        "sv-SE",
+        "id-ID",
+        "pl-PL",
+        "ja-JP",
+        "zh-TW",
+        "zh-CN",
+        "ko-KR",
+        "th-TH",
+        "nl-NL",
+        "hu-HU",
+        "vi-VN",
+        "cs-CZ",
+        "da-DK",
+        "fi-FI",
+        "uk-UA",
+        "el-GR",
+        "ro-RO",
+        "nb-NO",
+        "sk-SK",
+        "tr-TR",
+        "ru-RU",
+    ],
+}
 
 IMAGE_SIZES = ["original", "large2x", "large", "medium", "small", "tiny"]
+# Image size for resizing the original images by the CDN to the target dimension,
+# Pexels images CDN is imgix, which accepts the resizing parameters in the links.
+TARGET_IMAGE_SIZE = "target"
+DEFAULT_TARGET_DIMENSION = 1024  # pixels
+DEFAULT_TARGET_QUALITY = 75
 
 REQUIRED_METADATA_FIELDS = {
     "Source URL": "url",
@@ -44,6 +180,10 @@ DOWNLOAD_TYPES = {
 }
 ALLOWED_IMAGE_FORMATS = [".jpg", ".jpeg", ".png"]
 
+# Settings for skipping near-duplicate images by their perceptual hashes.
+NEAR_DUPLICATE_THRESHOLD = int(os.getenv("PEXELS_NEAR_DUPLICATE_THRESHOLD", 6))
+PHASH_METADATA_KEY = "Perceptual hash"
+
 
 def key_from_file() -> Optional[str]:
     """Tries to load Pexels API key from the team files.
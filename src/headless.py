@@ -0,0 +1,211 @@
+"""Headless batch mode, which runs the upload jobs from the job file without the UI.
+
+The job file is a JSON file with the list of jobs and optional default parameters
+for all of them. Each job needs at least the search query, other parameters have the
+same meaning as the fields of the app UI:
+
+    {
+        "defaults": {"images_number": 500, "upload_method": "files"},
+        "jobs": [
+            {"search_query": "dog", "project_name": "Dogs"},
+            {"search_query": "cat", "images_number": 100, "dataset_id": 12345}
+        ]
+    }
+
+The Pexels API key is read from the PEXELS_API_KEY environment variable or from the
+team files, the same way as in the app. The summary of all jobs is printed to stdout
+as JSON or saved to the specified file.
+
+Usage:
+    python -m src.headless jobs.json [--output summary.json] [--resume]
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from typing import Dict, List
+
+import supervisely as sly
+
+import src.globals as g
+import src.engine as engine
+import src.pexels as pexels
+import src.spool as spool
+
+from src.journal import Journal
+
+# Default parameters of the job, the same as the default values in the app UI.
+DEFAULT_PARAMS = {
+    "images_number": 1,
+    "start_number": 0,
+    "image_size": g.IMAGE_SIZES[0],
+    "target_dimension": g.DEFAULT_TARGET_DIMENSION,
+    "target_quality": g.DEFAULT_TARGET_QUALITY,
+    "metadata": list(g.REQUIRED_METADATA_FIELDS.keys()),
+    "upload_method": "files",
+    "batch_size": 500,
+    "max_workers": os.cpu_count(),
+    "search_workers": g.SEARCH_WORKERS,
+    "in_memory": False,
+    "skip_near_duplicates": False,
+    "skip_workspace_duplicates": False,
+    "shard_filters": [],
+    "auto_tune": False,
+    "download_engine": g.DEFAULT_DOWNLOAD_ENGINE,
+    "project_id": None,
+    "dataset_id": None,
+    "project_name": None,
+    "dataset_name": None,
+}
+
+
+def read_jobs(path: str) -> List[Dict]:
+    """Reads the job file and returns the parameters of the jobs with applied defaults.
+
+    Args:
+        path (str): path to the job file
+
+    Raises:
+        ValueError: if the job file has no jobs or some job has unknown parameters
+            or no search query
+
+    Returns:
+        List[Dict]: parameters of the jobs
+    """
+    with open(path) as f:
+        data = json.load(f)
+
+    # The job file can also contain just the list of jobs.
+    if isinstance(data, list):
+        data = {"jobs": data}
+
+    defaults = {**DEFAULT_PARAMS, **data.get("defaults", {})}
+    jobs = []
+    for number, job in enumerate(data.get("jobs", []), start=1):
+        params = {**defaults, **job}
+        unknown = set(params) - set(DEFAULT_PARAMS) - {"search_query"}
+        if unknown:
+            raise ValueError(f"Job {number} has unknown parameters: {sorted(unknown)}.")
+        if not params.get("search_query"):
+            raise ValueError(f"Job {number} has no search query.")
+        unknown_filters = set(params["shard_filters"]) - set(g.SHARD_FILTERS)
+        if unknown_filters:
+            raise ValueError(
+                f"Job {number} has unknown shard filters: {sorted(unknown_filters)}."
+            )
+        if params["image_size"] not in g.IMAGE_SIZES + [g.TARGET_IMAGE_SIZE]:
+            raise ValueError(
+                f"Job {number} has unknown image size: {params['image_size']}."
+            )
+        if params["upload_method"] not in g.DOWNLOAD_TYPES:
+            raise ValueError(
+                f"Job {number} has unknown upload method: {params['upload_method']}."
+            )
+        if params["download_engine"] not in g.DOWNLOAD_ENGINES:
+            raise ValueError(
+                f"Job {number} has unknown download engine: {params['download_engine']}."
+            )
+        jobs.append(params)
+
+    if not jobs:
+        raise ValueError(f"There are no jobs in the job file {path}.")
+    return jobs
+
+
+def run_job(journal: Journal, api_key: str) -> Dict:
+    """Runs the job with the parameters from the journal and returns its summary.
+
+    Args:
+        journal (Journal): journal of the new or unfinished job
+        api_key (str): Pexels API key
+
+    Returns:
+        Dict: summary of the job with the error if the job was not finished
+    """
+    job = engine.Job(journal, api_key)
+
+    # Refuse to start the job if the remaining API quota is not enough to finish it.
+    pages_number = job.get_required_requests()
+    if not pexels.can_afford(api_key, pages_number):
+        error = (
+            f"The job needs {pages_number} requests to the Pexels API, but only "
+            f"{pexels.rate_limiter.remaining} requests left."
+        )
+        sly.logger.error(error)
+        return {**job.get_summary(), "error": error}
+
+    try:
+        # The summary contains the error if one of the stages has stopped the job.
+        return job.run()
+    except Exception as error:
+        sly.logger.exception(f"The job failed with error: {error}.")
+        return {**job.get_summary(), "error": str(error)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Uploads images from Pexels to Supervisely datasets without the UI."
+    )
+    parser.add_argument("jobs", help="path to the JSON job file")
+    parser.add_argument(
+        "--output", help="path to save the JSON summary, printed to stdout if not set"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="resume the unfinished job from the journal before running the job file",
+    )
+    args = parser.parse_args()
+
+    api_key = os.getenv("PEXELS_API_KEY") or g.key_from_file()
+    if not api_key:
+        sly.logger.error("Pexels API key is not set in the PEXELS_API_KEY variable.")
+        sys.exit(2)
+
+    # Remove the images left by the crashed runs before starting the jobs.
+    spool.sweep(g.SPOOL_DIR)
+
+    journals = []
+    if args.resume:
+        journal = Journal.load()
+        if journal is not None:
+            journals.append(journal)
+    journals.extend(Journal(params) for params in read_jobs(args.jobs))
+
+    results = []
+    skipped_jobs = []
+    for journal in journals:
+        if results and results[-1]["error"] is not None:
+            # The journal of the failed job is the only one of the workspace, so the next
+            # jobs are not started to keep it for resuming.
+            skipped_jobs.append(journal.params)
+            continue
+        results.append(run_job(journal, api_key))
+    if skipped_jobs:
+        sly.logger.warning(
+            f"{len(skipped_jobs)} jobs were not started after the failed job. Resume it "
+            "with the --resume argument and run the skipped jobs from the summary."
+        )
+
+    summary = {
+        "jobs": results,
+        "uploaded_images": sum(result["uploaded_images"] for result in results),
+        "failed_jobs": sum(result["error"] is not None for result in results),
+        "skipped_jobs": skipped_jobs,
+    }
+
+    output = json.dumps(summary, indent=4)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        sly.logger.info(f"The summary is saved to {args.output}.")
+    else:
+        print(output)
+
+    sys.exit(1 if summary["failed_jobs"] or skipped_jobs else 0)
+
+
+if __name__ == "__main__":
+    main()
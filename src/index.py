@@ -0,0 +1,129 @@
+import os
+
+from collections import Counter
+from typing import Container, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import supervisely as sly
+
+# Keys of the counters for the images skipped while filtering the search results.
+BAD_LINKS = "bad_links"
+BAD_EXTENSIONS = "bad_extensions"
+DUPLICATES = "duplicates"
+EXISTED_DUPLICATES = "existed_duplicates"
+WORKSPACE_DUPLICATES = "workspace_duplicates"
+# Key of the counter for the downloaded files rejected as invalid images.
+BAD_FILES = "bad_files"
+
+NAME_PREFIX = "pexels_"
+
+
+def get_pexels_id(name: str) -> Optional[int]:
+    """Extracts Pexels photo ID from the image name, e.g. 123 from pexels_123.jpg.
+
+    Args:
+        name (str): name of the image
+
+    Returns:
+        Optional[int]: Pexels photo ID or None if the name wasn't created by the app
+    """
+    name_without_ext = name.split(".")[0]
+    if not name_without_ext.startswith(NAME_PREFIX):
+        return
+    try:
+        return int(name_without_ext[len(NAME_PREFIX) :])
+    except ValueError:
+        return
+
+
+def build_index(names: Iterable[str]) -> Set[int]:
+    """Builds the set of Pexels photo IDs from the image names for constant time lookups.
+
+    Args:
+        names (Iterable[str]): names of the images, e.g. from the dataset
+
+    Returns:
+        Set[int]: set of Pexels photo IDs
+    """
+    index = set()
+    for name in names:
+        photo_id = get_pexels_id(name)
+        if photo_id is not None:
+            index.add(photo_id)
+    return index
+
+
+def filter_images(
+    images: List[Dict],
+    image_size: str,
+    allowed_formats: List[str],
+    seen_ids: Set[int],
+    existing_ids: Set[int],
+    counters: Counter,
+    workspace_ids: Container[int] = (),
+) -> Iterator[Tuple[str, str, Dict]]:
+    """Filters the images from the search results and yields only the images
+    which are suitable for uploading. Each check is a hash lookup, so the filtering
+    time grows linearly with the number of results and doesn't depend on the dataset size.
+
+    Args:
+        images (List[Dict]): images from the Pexels API search results
+        image_size (str): size of images to download
+        allowed_formats (List[str]): list of allowed image extensions
+        seen_ids (Set[int]): IDs of the photos already yielded, updated in place
+        existing_ids (Set[int]): IDs of the photos which already exist in the dataset
+        counters (Counter): counters of the skipped images, updated in place
+        workspace_ids (Container[int]): IDs of the photos which exist in other datasets
+            of the workspace, not checked by default
+
+    Yields:
+        Iterator[Tuple[str, str, Dict]]: image name, link and the source image
+    """
+    for image in images:
+        photo_id = image.get("id")
+
+        # Extract the link to the image of the specified size.
+        link = image.get("src").get(image_size)
+
+        # Checking if the link is correct.
+        if not link:
+            sly.logger.debug(f"Image with id {photo_id} is skipped due to no link.")
+            counters[BAD_LINKS] += 1
+            continue
+
+        # Extracting extension from the link.
+        extension = os.path.splitext(link)[1]
+        if "?" in extension:
+            extension = extension.split("?")[0]
+
+        if extension not in allowed_formats:
+            sly.logger.debug(
+                f"The image with link {link} is skipped due to wrong extension."
+            )
+            counters[BAD_EXTENSIONS] += 1
+            continue
+        elif photo_id in seen_ids:
+            sly.logger.debug(f"The image with link {link} is skipped due to duplicate.")
+            counters[DUPLICATES] += 1
+            continue
+
+        # Using Pexels photo ID as the image name.
+        name = f"{NAME_PREFIX}{photo_id}{extension}"
+
+        # Check if the image already exists in the dataset.
+        if photo_id in existing_ids:
+            counters[EXISTED_DUPLICATES] += 1
+            sly.logger.debug(
+                f"Image with name {name} is skipped because it already exists in the dataset."
+            )
+            continue
+
+        # Check if the image already exists in some other dataset of the workspace.
+        if photo_id in workspace_ids:
+            counters[WORKSPACE_DUPLICATES] += 1
+            sly.logger.debug(
+                f"Image with name {name} is skipped because it already exists in the workspace."
+            )
+            continue
+
+        seen_ids.add(photo_id)
+        yield name, link, image
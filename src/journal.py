@@ -0,0 +1,285 @@
+import json
+import os
+import threading
+import time
+
+from typing import Collection, Dict, List, Optional
+
+import supervisely as sly
+
+import src.globals as g
+import src.index as index
+
+from src.photo import Photo
+
+
+class Journal:
+    """Checkpoint journal of the upload job, which allows to resume the job after
+    the app task was stopped. It contains the job parameters, the filtered images
+    of the fetched search pages of each search query and the IDs of the uploaded
+    Pexels photos.
+    The journal is saved in the JSON lines format: each fetched page, uploaded batch
+    and update of the parameters is appended to the local file as one record,
+    so the saving time doesn't grow with the number of pages. The local file is
+    uploaded to the team files not more often than JOURNAL_UPLOAD_INTERVAL.
+    The file is written without holding the lock of the journal, so the search
+    and upload stages are not blocked by the file operations.
+
+    Args:
+        params (Dict): parameters of the job
+        pages (Optional[Dict[str, Dict[int, List[Photo]]]]): images of the fetched pages
+            by search queries
+        uploaded_ids (Optional[List[int]]): IDs of the uploaded Pexels photos
+    """
+
+    def __init__(
+        self,
+        params: Dict,
+        pages: Optional[Dict[str, Dict[int, List[Photo]]]] = None,
+        uploaded_ids: Optional[List[int]] = None,
+    ):
+        self.params = params
+        self.pages = pages or {}
+        self.uploaded_ids = set(uploaded_ids or [])
+        # Guards the state of the journal.
+        self.lock = threading.Lock()
+        # Guards the local file and the uploads of it to the team files.
+        self.file_lock = threading.Lock()
+        self.upload_lock = threading.Lock()
+        self.uploaded_at: Optional[float] = None
+
+    @classmethod
+    def load(cls) -> Optional["Journal"]:
+        """Loads the journal of the unfinished job from the local file or,
+        if the task was restarted, from the team files.
+
+        Returns:
+            Optional[Journal]: journal of the unfinished job or None if there is no one
+        """
+        try:
+            if not os.path.exists(g.JOURNAL_LOCAL_PATH):
+                if not g.api.file.exists(g.TEAM_ID, g.JOURNAL_REMOTE_PATH):
+                    return
+                os.makedirs(os.path.dirname(g.JOURNAL_LOCAL_PATH), exist_ok=True)
+                g.api.file.download(
+                    g.TEAM_ID, g.JOURNAL_REMOTE_PATH, g.JOURNAL_LOCAL_PATH
+                )
+            with open(g.JOURNAL_LOCAL_PATH) as f:
+                lines = f.readlines()
+        except Exception as error:
+            sly.logger.warning(f"The job journal was not loaded with error: {error}.")
+            return
+
+        params, pages, uploaded_ids = None, {}, []
+        for line_number, line in enumerate(lines, 1):
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # The last record is cut off if the task was stopped while writing it.
+                sly.logger.warning(
+                    f"Line {line_number} of the job journal is damaged and skipped."
+                )
+                continue
+            if "params" in record:
+                params = record["params"]
+            elif "page" in record:
+                search_query, page_number, items = record["page"]
+                pages.setdefault(search_query, {})[page_number] = [
+                    Photo.from_item(item) for item in items
+                ]
+            elif "uploaded" in record:
+                uploaded_ids.extend(record["uploaded"])
+        if params is None:
+            sly.logger.warning("The job journal has no parameters of the job.")
+            return
+
+        journal = cls(params, pages, uploaded_ids)
+        sly.logger.info(
+            f"Loaded the journal of the unfinished job with {journal.pages_number} "
+            f"fetched pages and {len(journal.uploaded_ids)} uploaded images."
+        )
+        return journal
+
+    @property
+    def pages_number(self) -> int:
+        """Number of the fetched pages of all search queries."""
+        return sum(len(query_pages) for query_pages in self.pages.values())
+
+    def has_page(self, search_query: str, page_number: int) -> bool:
+        """Checks if the page was fetched before.
+
+        Args:
+            search_query (str): search query of the page
+            page_number (int): number of the search results page
+
+        Returns:
+            bool: True if the page is in the journal
+        """
+        return page_number in self.pages.get(search_query, {})
+
+    def get_page(self, search_query: str, page_number: int) -> List[Photo]:
+        """Returns the filtered images of the fetched page.
+
+        Args:
+            search_query (str): search query of the page
+            page_number (int): number of the search results page
+
+        Returns:
+            List[Photo]: images of the page
+        """
+        return self.pages[search_query][page_number]
+
+    def add_page(self, search_query: str, page_number: int, items: List[Photo]):
+        """Adds the filtered images of the fetched page and appends them to the file.
+
+        Args:
+            search_query (str): search query of the page
+            page_number (int): number of the search results page
+            items (List[Photo]): images of the page
+        """
+        with self.lock:
+            self.pages.setdefault(search_query, {})[page_number] = items
+        self.append(
+            {"page": [search_query, page_number, [photo.to_item() for photo in items]]}
+        )
+
+    def is_uploaded(self, name: str) -> bool:
+        """Checks if the image was uploaded before.
+
+        Args:
+            name (str): name of the image
+
+        Returns:
+            bool: True if the image was uploaded
+        """
+        return index.get_pexels_id(name) in self.uploaded_ids
+
+    def add_uploaded(self, names: List[str]):
+        """Adds the uploaded images, appends them to the local file and uploads
+        the journal to the team files if the upload interval has passed.
+
+        Args:
+            names (List[str]): names of the uploaded images
+        """
+        ids = index.build_index(names)
+        with self.lock:
+            self.uploaded_ids.update(ids)
+        self.append({"uploaded": sorted(ids)})
+        self.upload()
+
+    def count_uploaded(
+        self, search_query: str, excluded_ids: Collection[int] = ()
+    ) -> int:
+        """Counts the uploaded images which were found by the search query.
+        Each image is counted only for the first query which found it.
+
+        Args:
+            search_query (str): search query of the images
+            excluded_ids (Collection[int]): IDs of the Pexels photos which are not
+                counted, e.g. uploaded by the interrupted run of the job
+
+        Returns:
+            int: number of the uploaded images
+        """
+        with self.lock:
+            uploaded_ids = self.uploaded_ids.difference(excluded_ids)
+            return sum(
+                index.get_pexels_id(photo.name) in uploaded_ids
+                for items in self.pages.get(search_query, {}).values()
+                for photo in items
+            )
+
+    def update_params(self, **params):
+        """Updates the job parameters, e.g. IDs of the created project and dataset,
+        and uploads the journal to the team files at once.
+
+        Args:
+            **params: parameters to update
+        """
+        with self.lock:
+            self.params.update(params)
+            record = {"params": dict(self.params)}
+        self.append(record)
+        self.upload(force=True)
+
+    def append(self, record: Dict):
+        """Appends the record to the local file of the journal.
+
+        Args:
+            record (Dict): record of the journal
+        """
+        line = json.dumps(record) + "\n"
+        with self.file_lock:
+            with open(g.JOURNAL_LOCAL_PATH, "a") as f:
+                f.write(line)
+
+    def save(self, remote: bool = False):
+        """Rewrites the local file with all records of the journal and optionally
+        uploads it to the team files. Called when the job is started, so the file
+        of the previous job is replaced.
+
+        Args:
+            remote (bool): if True, the journal is also uploaded to the team files
+        """
+        with self.lock:
+            records = [{"params": dict(self.params)}]
+            records.extend(
+                {
+                    "page": [
+                        search_query,
+                        page_number,
+                        [photo.to_item() for photo in items],
+                    ]
+                }
+                for search_query, query_pages in self.pages.items()
+                for page_number, items in query_pages.items()
+            )
+            if self.uploaded_ids:
+                records.append({"uploaded": sorted(self.uploaded_ids)})
+        lines = "".join(json.dumps(record) + "\n" for record in records)
+
+        os.makedirs(os.path.dirname(g.JOURNAL_LOCAL_PATH), exist_ok=True)
+        with self.file_lock:
+            temp_path = f"{g.JOURNAL_LOCAL_PATH}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(lines)
+            os.replace(temp_path, g.JOURNAL_LOCAL_PATH)
+        if remote:
+            self.upload(force=True)
+
+    def upload(self, force: bool = False):
+        """Uploads the local file of the journal to the team files, if the upload
+        interval has passed since the previous upload or if it's forced.
+
+        Args:
+            force (bool): if True, the journal is uploaded regardless of the interval
+        """
+        with self.upload_lock:
+            if (
+                not force
+                and self.uploaded_at is not None
+                and time.monotonic() - self.uploaded_at < g.JOURNAL_UPLOAD_INTERVAL
+            ):
+                return
+            try:
+                if g.api.file.exists(g.TEAM_ID, g.JOURNAL_REMOTE_PATH):
+                    g.api.file.remove(g.TEAM_ID, g.JOURNAL_REMOTE_PATH)
+                g.api.file.upload(g.TEAM_ID, g.JOURNAL_LOCAL_PATH, g.JOURNAL_REMOTE_PATH)
+                self.uploaded_at = time.monotonic()
+            except Exception as error:
+                sly.logger.warning(
+                    f"The job journal was not saved to the team files with error: {error}."
+                )
+
+    def remove(self):
+        """Removes the journal of the finished job locally and from the team files."""
+        with self.file_lock, self.upload_lock:
+            if os.path.exists(g.JOURNAL_LOCAL_PATH):
+                os.remove(g.JOURNAL_LOCAL_PATH)
+            try:
+                if g.api.file.exists(g.TEAM_ID, g.JOURNAL_REMOTE_PATH):
+                    g.api.file.remove(g.TEAM_ID, g.JOURNAL_REMOTE_PATH)
+            except Exception as error:
+                sly.logger.warning(
+                    f"The job journal was not removed from the team files with error: {error}."
+                )
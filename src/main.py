@@ -1,12 +1,30 @@
 import supervisely as sly
 
+from fastapi.responses import PlainTextResponse
 from supervisely.app.widgets import Container
 
+import src.globals as g
+import src.metrics as metrics
+import src.spool as spool
+
 import src.ui.keys as keys
 import src.ui.input as input
 import src.ui.settings as settings
 import src.ui.output as output
 
+# Remove the images left by the crashed runs of the app before the first job.
+spool.sweep(g.SPOOL_DIR)
+
 layout = Container(widgets=[keys.card, input.card, settings.card, output.card])
 
 app = sly.Application(layout=layout)
+
+server = app.get_server()
+
+
+@server.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Returns the per-stage metrics of the current job in the Prometheus text format."""
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4"
+    )
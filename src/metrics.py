@@ -0,0 +1,221 @@
+import bisect
+import threading
+
+from collections import Counter
+from typing import Dict, Optional
+
+# Names of the instrumented stages of the job.
+SEARCH = "search"
+DOWNLOAD = "download"
+VALIDATION = "validation"
+UPLOAD = "upload"
+STAGES = [SEARCH, DOWNLOAD, VALIDATION, UPLOAD]
+
+# Upper bounds of the latency histogram buckets in seconds.
+BUCKETS = [
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+]
+QUANTILES = [0.5, 0.95, 0.99]
+PREFIX = "pexels_downloader"
+
+
+class StageMetrics:
+    """Counters and the latency histogram of one stage. The histogram has fixed buckets,
+    so the memory usage doesn't depend on the number of observations.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.bytes = 0
+        self.errors = Counter()
+        # The last bucket counts the observations above the largest bound.
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.latency_count = 0
+        self.latency_sum = 0.0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Estimates the latency quantile by linear interpolation inside the bucket.
+
+        Args:
+            q (float): quantile from 0 to 1
+
+        Returns:
+            Optional[float]: latency in seconds or None if there are no observations
+        """
+        if not self.latency_count:
+            return
+        rank = q * self.latency_count
+        cumulative = 0
+        for number, count in enumerate(self.buckets):
+            if cumulative + count >= rank and count:
+                lower = BUCKETS[number - 1] if number else 0.0
+                upper = BUCKETS[number] if number < len(BUCKETS) else BUCKETS[-1]
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return BUCKETS[-1]
+
+
+class Metrics:
+    """Thread-safe registry of the per-stage metrics of the job: numbers of processed
+    items and bytes, errors by class and latency histograms. The metrics are rendered
+    in the Prometheus text format for the /metrics endpoint and summarized in the log.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stages: Dict[str, StageMetrics] = {}
+        self.reset()
+
+    def reset(self):
+        """Clears the metrics before the new job."""
+        with self.lock:
+            self.stages = {stage: StageMetrics() for stage in STAGES}
+
+    def observe(self, stage: str, seconds: float, items: int = 1, size: int = 0):
+        """Records the successfully processed items of the stage.
+
+        Args:
+            stage (str): name of the stage
+            seconds (float): latency of the operation
+            items (int): number of processed items, e.g. images in the uploaded batch
+            size (int): number of processed bytes
+        """
+        with self.lock:
+            metrics = self.stages.setdefault(stage, StageMetrics())
+            metrics.items += items
+            metrics.bytes += size
+            metrics.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+            metrics.latency_count += 1
+            metrics.latency_sum += seconds
+
+    def error(self, stage: str, error: str):
+        """Records the failed operation of the stage.
+
+        Args:
+            stage (str): name of the stage
+            error (str): class of the error, e.g. exception name or HTTP status
+        """
+        with self.lock:
+            self.stages.setdefault(stage, StageMetrics()).errors[error] += 1
+
+    def summary(self) -> Dict[str, Dict]:
+        """Returns the summary of the metrics for the log and the job summary.
+
+        Returns:
+            Dict[str, Dict]: items, bytes, errors and latency quantiles by stages
+        """
+        with self.lock:
+            return {
+                stage: {
+                    "items": metrics.items,
+                    "bytes": metrics.bytes,
+                    "errors": dict(metrics.errors),
+                    **{
+                        f"p{round(q * 100)}": _round(metrics.quantile(q))
+                        for q in QUANTILES
+                    },
+                }
+                for stage, metrics in self.stages.items()
+                if metrics.latency_count or metrics.errors
+            }
+
+    def render(self) -> str:
+        """Renders the metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: metrics text
+        """
+        lines = []
+
+        def family(name: str, kind: str, help: str) -> str:
+            metric = f"{PREFIX}_{name}"
+            lines.append(f"# HELP {metric} {help}")
+            lines.append(f"# TYPE {metric} {kind}")
+            return metric
+
+        with self.lock:
+            stages = sorted(self.stages.items())
+
+            metric = family("items_total", "counter", "Processed items by stage.")
+            for stage, metrics in stages:
+                lines.append(f'{metric}{{stage="{stage}"}} {metrics.items}')
+
+            metric = family("bytes_total", "counter", "Processed bytes by stage.")
+            for stage, metrics in stages:
+                lines.append(f'{metric}{{stage="{stage}"}} {metrics.bytes}')
+
+            metric = family("errors_total", "counter", "Errors by stage and class.")
+            for stage, metrics in stages:
+                for error, count in sorted(metrics.errors.items()):
+                    lines.append(
+                        f'{metric}{{stage="{stage}",error="{error}"}} {count}'
+                    )
+
+            metric = family(
+                "latency_seconds", "histogram", "Latency of the operations by stage."
+            )
+            for stage, metrics in stages:
+                cumulative = 0
+                for bound, count in zip(BUCKETS + ["+Inf"], metrics.buckets):
+                    cumulative += count
+                    lines.append(
+                        f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {cumulative}'
+                    )
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {metrics.latency_sum}')
+                lines.append(
+                    f'{metric}_count{{stage="{stage}"}} {metrics.latency_count}'
+                )
+
+            metric = family(
+                "latency_quantile_seconds",
+                "gauge",
+                "Latency quantiles by stage estimated from the histogram.",
+            )
+            for stage, metrics in stages:
+                for q in QUANTILES:
+                    value = metrics.quantile(q)
+                    if value is not None:
+                        lines.append(
+                            f'{metric}{{stage="{stage}",quantile="{q}"}} {value}'
+                        )
+        return "\n".join(lines) + "\n"
+
+
+def get_error_class(error: Exception) -> str:
+    """Returns the class of the error for the metrics: HTTP status for HTTP errors
+    and the exception name for others.
+
+    Args:
+        error (Exception): raised exception
+
+    Returns:
+        str: class of the error
+    """
+    response = getattr(error, "response", None)
+    if response is not None and getattr(response, "status_code", None):
+        return f"http_{response.status_code}"
+    # Errors of the asyncio download engine keep the status in the error itself.
+    if isinstance(getattr(error, "status", None), int):
+        return f"http_{error.status}"
+    return type(error).__name__
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 4)
+
+
+# Metrics of the current job, which are exposed on the /metrics endpoint.
+registry = Metrics()
@@ -0,0 +1,361 @@
+import random
+import threading
+import time
+import requests
+
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from requests.adapters import HTTPAdapter
+
+import supervisely as sly
+
+import src.globals as g
+import src.pipeline as pipeline
+
+from src.cache import SearchCache
+
+try:
+    import aiohttp
+except ImportError:
+    # The asyncio download engine is optional, the thread engine works without it.
+    aiohttp = None
+
+# Shared HTTP session for all calls to the Pexels API and CDN, which keeps
+# connections alive between requests instead of opening a new one for each image.
+session = requests.Session()
+
+
+def configure_session(pool_size: int):
+    """Mounts the HTTP adapters with the connection pool of the specified size,
+    so each worker can reuse its own keep-alive connection.
+
+    Args:
+        pool_size (int): maximum number of connections to keep in the pool for one host
+    """
+    adapter = HTTPAdapter(pool_connections=g.POOL_CONNECTIONS, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    sly.logger.debug(f"HTTP session is configured with the pool size {pool_size}.")
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """Sends GET request using the shared session with the configured timeouts.
+
+    Args:
+        url (str): URL to send the request to
+        **kwargs: additional arguments for the requests.Session.get() method
+
+    Returns:
+        requests.Response: response object
+    """
+    kwargs.setdefault("timeout", (g.CONNECT_TIMEOUT, g.READ_TIMEOUT))
+    return session.get(url, **kwargs)
+
+
+def create_async_session(pool_size: int) -> "aiohttp.ClientSession":
+    """Creates the HTTP session for the asyncio download engine with the same timeouts
+    as the shared session. Must be called in the running event loop.
+
+    Args:
+        pool_size (int): maximum number of connections to keep in the pool
+
+    Returns:
+        aiohttp.ClientSession: session for the concurrent downloads
+    """
+    timeout = aiohttp.ClientTimeout(
+        sock_connect=g.CONNECT_TIMEOUT, sock_read=g.READ_TIMEOUT
+    )
+    connector = aiohttp.TCPConnector(limit=pool_size, limit_per_host=pool_size)
+    return aiohttp.ClientSession(timeout=timeout, connector=connector)
+
+
+def get_resized_link(link: str, max_dimension: int, quality: Optional[int] = None) -> str:
+    """Rewrites the link to the image on the Pexels CDN, so the CDN resizes the image
+    to fit into the square with the specified side and compresses it. Smaller images
+    are not upscaled.
+
+    Args:
+        link (str): link to the image from the search results
+        max_dimension (int): maximum width and height of the image in pixels
+        quality (Optional[int]): JPEG quality from 1 to 100, CDN default if not set
+
+    Returns:
+        str: link to the resized image
+    """
+    url = urlsplit(link)
+    query = dict(parse_qsl(url.query))
+    query.update(
+        {
+            "auto": "compress",
+            "cs": "tinysrgb",
+            "fit": "max",
+            "w": str(max_dimension),
+            "h": str(max_dimension),
+        }
+    )
+    if quality:
+        query["q"] = str(quality)
+    return urlunsplit(url._replace(query=urlencode(query)))
+
+
+class RateLimiter:
+    """Token bucket which paces the requests to the Pexels API and tracks the quota
+    announced by the API in the X-Ratelimit-* headers.
+
+    Args:
+        rate (float): number of tokens added to the bucket per second
+        capacity (int): maximum number of tokens in the bucket (burst size)
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.remaining: Optional[int] = None
+        self.reset: Optional[int] = None
+        self.lock = threading.Lock()
+
+    def acquire(self, cancel_token: Optional[pipeline.CancellationToken] = None):
+        """Blocks until the token is available and takes it from the bucket.
+        If the quota is exhausted, waits until the quota is reset.
+
+        Args:
+            cancel_token (Optional[pipeline.CancellationToken]): interrupts the waiting
+                if the job is cancelled
+        """
+        while True:
+            with self.lock:
+                self.expire_quota()
+                if self.remaining == 0 and self.reset is not None:
+                    delay = max(self.reset - time.time(), 0)
+                    sly.logger.warning(
+                        f"Pexels API quota is exhausted, waiting {delay:.0f} seconds "
+                        "until it is reset."
+                    )
+                else:
+                    delay = None
+            if delay is not None:
+                sleep(delay, cancel_token)
+                continue
+
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining:
+                        # Count the request until the next response updates the quota.
+                        self.remaining -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            sleep(delay, cancel_token)
+
+    def update(self, headers: Dict[str, str]):
+        """Updates the remaining quota from the response headers.
+
+        Args:
+            headers (Dict[str, str]): headers of the Pexels API response
+        """
+        try:
+            remaining = int(headers["X-Ratelimit-Remaining"])
+            reset = int(headers["X-Ratelimit-Reset"])
+        except (KeyError, ValueError):
+            return
+        with self.lock:
+            self.remaining = remaining
+            self.reset = reset
+
+    def expire_quota(self):
+        """Forgets the remaining quota after its reset time, so the quota is unknown
+        until the next response. Must be called with the lock held.
+        """
+        if self.reset is not None and time.time() >= self.reset:
+            self.remaining = None
+            self.reset = None
+
+    def is_quota_known(self) -> bool:
+        """Checks if the remaining quota was announced by the API and was not reset since.
+
+        Returns:
+            bool: True if the remaining quota is known
+        """
+        with self.lock:
+            self.expire_quota()
+            return self.remaining is not None
+
+    def can_afford(self, requests_number: int) -> bool:
+        """Checks if the remaining quota is enough for the specified number of requests.
+        If the quota is unknown yet or was reset, returns True.
+
+        Args:
+            requests_number (int): number of requests to make
+
+        Returns:
+            bool: True if the quota is enough or unknown, False otherwise
+        """
+        with self.lock:
+            self.expire_quota()
+            return self.remaining is None or self.remaining >= requests_number
+
+
+rate_limiter = RateLimiter(g.API_REQUESTS_PER_SECOND, g.API_BURST_SIZE)
+
+
+def search(
+    api_key: str,
+    params: Dict[str, str],
+    cancel_token: Optional[pipeline.CancellationToken] = None,
+) -> requests.Response:
+    """Sends the search request to the Pexels API through the rate limiter.
+    Throttled and failed requests are retried with exponential backoff.
+
+    Args:
+        api_key (str): Pexels API key
+        params (Dict[str, str]): search request parameters
+        cancel_token (Optional[pipeline.CancellationToken]): interrupts the waiting
+            for the rate limit and the retries if the job is cancelled
+
+    Raises:
+        pipeline.Cancelled: if the job was cancelled while waiting
+
+    Returns:
+        requests.Response: last response from the Pexels API
+    """
+    headers = {"Authorization": api_key}
+
+    for attempt in range(g.API_MAX_RETRIES + 1):
+        rate_limiter.acquire(cancel_token)
+        try:
+            response = get(g.PEXELS_API_URL, headers=headers, params=params)
+        except requests.RequestException as error:
+            if attempt == g.API_MAX_RETRIES:
+                raise
+            reason, retry_headers = error, {}
+        else:
+            rate_limiter.update(response.headers)
+            if response.status_code not in g.RETRY_STATUS_CODES:
+                return response
+            if attempt == g.API_MAX_RETRIES:
+                return response
+            reason, retry_headers = f"status {response.status_code}", response.headers
+
+        delay = get_backoff_delay(attempt, retry_headers)
+        sly.logger.warning(
+            f"Pexels API request failed with {reason}. "
+            f"Retrying in {delay:.1f} seconds (attempt {attempt + 1})."
+        )
+        sleep(delay, cancel_token)
+
+
+def can_afford(
+    api_key: str,
+    requests_number: int,
+    cancel_token: Optional[pipeline.CancellationToken] = None,
+) -> bool:
+    """Checks if the remaining quota of the Pexels API is enough for the specified
+    number of requests. If the quota is unknown, e.g. no requests were made yet
+    or the quota was reset, it's requested with the search for one image.
+
+    Args:
+        api_key (str): Pexels API key
+        requests_number (int): number of requests to make
+        cancel_token (Optional[pipeline.CancellationToken]): interrupts the request
+            if the job is cancelled
+
+    Returns:
+        bool: True if the quota is enough or can't be requested, False otherwise
+    """
+    if not rate_limiter.is_quota_known():
+        try:
+            search(api_key, {"query": g.QUOTA_CHECK_QUERY, "per_page": 1}, cancel_token)
+        except requests.RequestException as error:
+            sly.logger.warning(f"Pexels API quota was not checked with error: {error}.")
+    return rate_limiter.can_afford(requests_number)
+
+
+search_cache = SearchCache(
+    g.SEARCH_CACHE_PATH, g.SEARCH_CACHE_TTL, g.SEARCH_CACHE_MAX_SIZE
+)
+
+
+def search_page(
+    api_key: str,
+    params: Dict[str, str],
+    cancel_token: Optional[pipeline.CancellationToken] = None,
+) -> Optional[Dict]:
+    """Returns the search results page from the cache or requests it from the Pexels API
+    and saves it to the cache if the request was successful.
+
+    Args:
+        api_key (str): Pexels API key
+        params (Dict[str, str]): search request parameters
+        cancel_token (Optional[pipeline.CancellationToken]): interrupts the request
+            if the job is cancelled
+
+    Returns:
+        Optional[Dict]: response data or None if the API did not answer correctly
+    """
+    data = search_cache.get(params)
+    if data is not None:
+        sly.logger.debug(f"Search results were loaded from the cache: {params}.")
+        return data
+
+    response = search(api_key, params, cancel_token)
+    if response.status_code != 200:
+        sly.logger.warning(
+            f"Pexels API answered with status {response.status_code}: {response.text}."
+        )
+        return
+
+    data = response.json()
+    search_cache.set(params, data)
+    return data
+
+
+def sleep(seconds: float, cancel_token: Optional[pipeline.CancellationToken] = None):
+    """Waits for the specified time, which is interrupted if the job is cancelled.
+
+    Args:
+        seconds (float): time to wait in seconds
+        cancel_token (Optional[pipeline.CancellationToken]): cancellation token of the job
+
+    Raises:
+        pipeline.Cancelled: if the job was cancelled while waiting
+    """
+    if cancel_token is None:
+        time.sleep(seconds)
+    else:
+        cancel_token.sleep(seconds)
+
+
+def get_backoff_delay(
+    attempt: int,
+    headers: Dict[str, str],
+    base: float = g.API_BACKOFF_BASE,
+    maximum: float = g.API_BACKOFF_MAX,
+) -> float:
+    """Returns the delay before the next retry. Uses the Retry-After header if the API
+    provided it, otherwise exponential backoff with jitter.
+
+    Args:
+        attempt (int): number of the failed attempt, starting from 0
+        headers (Dict[str, str]): headers of the failed response
+        base (float): delay after the first attempt in seconds
+        maximum (float): maximum delay in seconds
+
+    Returns:
+        float: delay in seconds
+    """
+    try:
+        return min(float(headers["Retry-After"]), maximum)
+    except (KeyError, ValueError):
+        delay = min(base * 2**attempt, maximum)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+
+configure_session(g.DEFAULT_POOL_SIZE)
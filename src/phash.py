@@ -0,0 +1,127 @@
+import io
+
+from typing import List, Optional, Union
+
+import numpy as np
+from PIL import Image
+
+import supervisely as sly
+
+# Size of the difference hash: HASH_SIZE x HASH_SIZE bits.
+HASH_SIZE = 8
+# Number of the index hashes compared with the batch at once to limit memory usage.
+COMPARE_CHUNK_SIZE = 10000
+# Number of set bits for each byte value to count Hamming distances.
+_POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def get_thumbnail(source: Union[str, bytes]) -> Optional[np.ndarray]:
+    """Decodes the image at reduced scale and returns the grayscale thumbnail
+    for computing the difference hash.
+
+    Args:
+        source (Union[str, bytes]): path to the image file or its content
+
+    Returns:
+        Optional[np.ndarray]: grayscale thumbnail with shape (HASH_SIZE, HASH_SIZE + 1)
+        or None if the image can't be decoded
+    """
+    try:
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        with Image.open(source) as image:
+            # JPEG decoder can downscale while decoding, which is much faster.
+            image.draft("L", (HASH_SIZE * 8, HASH_SIZE * 8))
+            thumbnail = image.convert("L").resize(
+                (HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR
+            )
+            return np.asarray(thumbnail, dtype=np.int16)
+    except Exception as error:
+        sly.logger.debug(f"Can't create the thumbnail for hashing: {error}.")
+
+
+def compute_hashes(thumbnails: List[np.ndarray]) -> np.ndarray:
+    """Computes the difference hashes for the batch of thumbnails at once.
+
+    Args:
+        thumbnails (List[np.ndarray]): grayscale thumbnails from get_thumbnail()
+
+    Returns:
+        np.ndarray: array of uint64 hashes
+    """
+    if not thumbnails:
+        return np.empty(0, dtype=np.uint64)
+    stack = np.stack(thumbnails)
+    bits = stack[:, :, 1:] > stack[:, :, :-1]
+    packed = np.packbits(bits.reshape(len(thumbnails), -1), axis=1)
+    return packed.view(">u8").ravel().astype(np.uint64)
+
+
+def hamming_distances(hashes: np.ndarray, other: np.ndarray) -> np.ndarray:
+    """Computes the matrix of Hamming distances between two arrays of hashes.
+
+    Args:
+        hashes (np.ndarray): array of N uint64 hashes
+        other (np.ndarray): array of M uint64 hashes
+
+    Returns:
+        np.ndarray: matrix of distances with shape (N, M)
+    """
+    xor = np.bitwise_xor(hashes[:, None], other[None, :])
+    return _POPCOUNT[xor.view(np.uint8)].reshape(*xor.shape, 8).sum(axis=-1)
+
+
+def to_hex(value: np.uint64) -> str:
+    """Returns the hash as hexadecimal string to store in the image metadata.
+
+    Args:
+        value (np.uint64): hash value
+
+    Returns:
+        str: hexadecimal string
+    """
+    return f"{int(value):016x}"
+
+
+class HashIndex:
+    """Index of the perceptual hashes of the images in the dataset, which is used
+    to find near-duplicate images before uploading them.
+
+    Args:
+        threshold (int): maximum Hamming distance between hashes of near-duplicates
+        hex_hashes (List[str]): hexadecimal hashes of the existing images
+    """
+
+    def __init__(self, threshold: int, hex_hashes: List[str] = ()):
+        self.threshold = threshold
+        self.hashes = np.array([int(h, 16) for h in hex_hashes], dtype=np.uint64)
+
+    def find_duplicates(self, hashes: np.ndarray) -> np.ndarray:
+        """Finds the hashes which are near-duplicates of the indexed hashes
+        or of the previous hashes in the same batch.
+
+        Args:
+            hashes (np.ndarray): array of uint64 hashes of the batch
+
+        Returns:
+            np.ndarray: boolean mask of the near-duplicate hashes
+        """
+        duplicates = np.zeros(len(hashes), dtype=bool)
+        for start in range(0, len(self.hashes), COMPARE_CHUNK_SIZE):
+            chunk = self.hashes[start : start + COMPARE_CHUNK_SIZE]
+            distances = hamming_distances(hashes, chunk)
+            duplicates |= (distances <= self.threshold).any(axis=1)
+
+        # Only the first image of the near-duplicates group within the batch is kept.
+        distances = hamming_distances(hashes, hashes)
+        earlier = np.tril(distances <= self.threshold, k=-1)
+        duplicates |= earlier.any(axis=1)
+        return duplicates
+
+    def add(self, hashes: np.ndarray):
+        """Adds the hashes of the uploaded images to the index.
+
+        Args:
+            hashes (np.ndarray): array of uint64 hashes
+        """
+        self.hashes = np.concatenate([self.hashes, hashes])
@@ -0,0 +1,128 @@
+import sys
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import src.globals as g
+
+# All Pexels photos have the same license, so the value is shared by all images
+# instead of being stored for each of them.
+LICENSE_KEY = "License"
+LICENSE = "Pexels license"
+
+# Names of the Pexels API attributes by the metadata fields.
+PEXELS_FIELDS = {**g.REQUIRED_METADATA_FIELDS, **g.OPTIONAL_METADATA_FIELDS}
+
+# Tuples of the metadata fields, which are shared by all images with the same fields.
+_fields_tuples: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+
+class Photo:
+    """Image of the search results, which flows through all stages of the job as one
+    object: the search yields it, the download stage adds the local file or content
+    and the upload stage reads the metadata of the batch.
+
+    The metadata is kept as the tuple of values of the shared tuple of fields,
+    and the dictionary is built only for the uploaded batch, so a found image takes
+    about half of the memory of the tuple with the name, link and metadata dictionary.
+
+    Args:
+        name (str): name of the image, e.g. pexels_123.jpg
+        link (str): global link to the image
+        fields (Tuple[str, ...]): metadata fields, the tuple from get_fields()
+        values (Tuple[Any, ...]): values of the metadata fields
+    """
+
+    __slots__ = (
+        "name",
+        "link",
+        "fields",
+        "values",
+        "source",
+        "thumbnail",
+        "phash",
+        "order",
+    )
+
+    def __init__(
+        self, name: str, link: str, fields: Tuple[str, ...], values: Tuple[Any, ...]
+    ):
+        self.name = name
+        self.link = link
+        self.fields = fields
+        self.values = values
+        # Local path or content of the downloaded image.
+        self.source: Optional[Union[str, bytes]] = None
+        # Downscaled image for the near-duplicates check and its perceptual hash.
+        self.thumbnail = None
+        self.phash: Optional[str] = None
+        # Position of the image in the search results of the job.
+        self.order = 0
+
+    @classmethod
+    def from_search(
+        cls, name: str, link: str, image: Dict, fields: Tuple[str, ...]
+    ) -> "Photo":
+        """Creates the record from the image of the Pexels API search results.
+
+        Args:
+            name (str): name of the image
+            link (str): global link to the image
+            image (Dict): image from the search results
+            fields (Tuple[str, ...]): metadata fields, the tuple from get_fields()
+
+        Returns:
+            Photo: record of the image
+        """
+        values = tuple(image.get(PEXELS_FIELDS[field]) for field in fields)
+        return cls(name, link, fields, values)
+
+    @classmethod
+    def from_item(cls, item: List) -> "Photo":
+        """Creates the record from the name, link and metadata saved in the journal.
+
+        Args:
+            item (List): name, link and metadata of the image
+
+        Returns:
+            Photo: record of the image
+        """
+        name, link, meta = item
+        fields = get_fields(meta.keys())
+        photo = cls(name, link, fields, tuple(meta[field] for field in fields))
+        photo.phash = meta.get(g.PHASH_METADATA_KEY)
+        return photo
+
+    @property
+    def meta(self) -> Dict[str, Any]:
+        """Metadata of the image for uploading to the dataset."""
+        meta = {LICENSE_KEY: LICENSE}
+        meta.update(zip(self.fields, self.values))
+        if self.phash is not None:
+            meta[g.PHASH_METADATA_KEY] = self.phash
+        return meta
+
+    def to_item(self) -> List:
+        """Returns the name, link and metadata of the image for saving to the journal.
+
+        Returns:
+            List: name, link and metadata of the image
+        """
+        return [self.name, self.link, self.meta]
+
+
+def get_fields(keys: Iterable[str]) -> Tuple[str, ...]:
+    """Returns the shared tuple of the interned metadata fields without the license,
+    which is the same for all images, and the perceptual hash, which is kept separately.
+
+    Args:
+        keys (Iterable[str]): metadata fields
+
+    Returns:
+        Tuple[str, ...]: tuple of the fields shared by all images with the same fields
+    """
+    fields = tuple(
+        sys.intern(key)
+        for key in keys
+        if key not in (LICENSE_KEY, g.PHASH_METADATA_KEY)
+    )
+    return _fields_tuples.setdefault(fields, fields)
@@ -0,0 +1,525 @@
+import asyncio
+import queue
+import threading
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncContextManager,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
+
+import supervisely as sly
+
+# Marker which is put into the queue when the stage has no more items.
+SENTINEL = object()
+
+# Timeout for blocking queue operations to check if the pipeline is still running.
+QUEUE_TIMEOUT = 0.5
+
+
+class Cancelled(Exception):
+    """Raised by the operations which were interrupted by the cancellation token."""
+
+
+class StageError(Exception):
+    """Put into the queue instead of the sentinel when the stage has stopped with error
+    and raised by the consumer of the queue, so the failure of the stage is not taken
+    for the end of the items.
+
+    Args:
+        error (Exception): error which has stopped the stage
+    """
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+def get_end_marker(error: Exception) -> "StageError":
+    """Returns the marker which is put into the queue when the stage has stopped
+    with error. The error of the previous stage is passed as is, so it's logged
+    only by the stage where it was raised.
+
+    Args:
+        error (Exception): error which has stopped the stage
+
+    Returns:
+        StageError: marker with the error
+    """
+    if isinstance(error, StageError):
+        return error
+    sly.logger.error(f"The pipeline stage has stopped with error: {error}.")
+    return StageError(error)
+
+
+class CancellationToken:
+    """Thread-safe cancellation flag shared by all stages of the pipeline. Long operations
+    check the token between their steps, e.g. between the chunks of the download, and
+    waiting on the token returns as soon as it's cancelled, so the pipeline stops after
+    the current network read instead of finishing the queued work.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+
+    def cancel(self):
+        """Cancels all operations which check the token."""
+        self.event.set()
+
+    def is_running(self) -> bool:
+        """Returns True if the token wasn't cancelled.
+
+        Returns:
+            bool: False if the pipeline was stopped
+        """
+        return not self.event.is_set()
+
+    def check(self, *args):
+        """Raises the exception if the token was cancelled. Accepts and ignores
+        any arguments, so it can be used as the progress callback of long calls.
+
+        Raises:
+            Cancelled: if the token was cancelled
+        """
+        if self.event.is_set():
+            raise Cancelled("The operation was cancelled.")
+
+    def sleep(self, seconds: float):
+        """Waits for the specified time or until the token is cancelled.
+
+        Args:
+            seconds (float): time to wait in seconds
+
+        Raises:
+            Cancelled: if the token was cancelled while waiting
+        """
+        if self.event.wait(seconds):
+            raise Cancelled("The operation was cancelled.")
+
+
+class MemoryBudget:
+    """Thread-safe counter of the bytes kept in memory by the pipeline stages.
+
+    Args:
+        limit (int): maximum number of bytes which can be reserved at the same time
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.lock = threading.Lock()
+
+    def reserve(self, size: int) -> bool:
+        """Reserves the specified number of bytes if it fits into the budget.
+
+        Args:
+            size (int): number of bytes to reserve
+
+        Returns:
+            bool: True if the bytes were reserved, False if the budget is exceeded
+        """
+        with self.lock:
+            if self.used + size > self.limit:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size: int):
+        """Returns the specified number of bytes to the budget.
+
+        Args:
+            size (int): number of bytes to release
+        """
+        with self.lock:
+            self.used = max(self.used - size, 0)
+
+
+def put(out_queue: queue.Queue, item: Any, is_running: Callable[[], bool]) -> bool:
+    """Puts the item into the bounded queue, waiting while the queue is full.
+
+    Args:
+        out_queue (queue.Queue): queue to put the item into
+        item (Any): item to put into the queue
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+    Returns:
+        bool: True if the item was put into the queue, False if the pipeline was stopped
+    """
+    while is_running():
+        try:
+            out_queue.put(item, timeout=QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def iterate(in_queue: queue.Queue, is_running: Callable[[], bool]) -> Iterator[Any]:
+    """Yields the items from the queue until the sentinel is received
+    or the pipeline is stopped.
+
+    Args:
+        in_queue (queue.Queue): queue to read the items from
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+    Raises:
+        StageError: if the stage which puts the items has stopped with error
+
+    Yields:
+        Iterator[Any]: items from the queue
+    """
+    while True:
+        try:
+            item = in_queue.get(timeout=QUEUE_TIMEOUT)
+        except queue.Empty:
+            if not is_running():
+                return
+            continue
+        if item is SENTINEL:
+            return
+        if isinstance(item, StageError):
+            raise item
+        yield item
+
+
+class Limiter:
+    """Semaphore with the limit which can be changed while the pipeline is running,
+    e.g. to adjust the number of concurrent downloads.
+
+    Args:
+        limit (int): maximum number of slots which can be acquired at the same time
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.used = 0
+        self.condition = threading.Condition()
+
+    def acquire(self, is_running: Callable[[], bool]) -> bool:
+        """Acquires the slot, waiting while all slots are used.
+
+        Args:
+            is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+        Returns:
+            bool: True if the slot was acquired, False if the pipeline was stopped
+        """
+        with self.condition:
+            while self.used >= self.limit:
+                if not is_running():
+                    return False
+                self.condition.wait(QUEUE_TIMEOUT)
+            self.used += 1
+            return True
+
+    def release(self):
+        """Returns the slot to the limiter."""
+        with self.condition:
+            self.used -= 1
+            self.condition.notify()
+
+    def set_limit(self, limit: int):
+        """Changes the number of slots, the slots which are in use are not interrupted.
+
+        Args:
+            limit (int): new maximum number of slots
+        """
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+
+def batched(
+    in_queue: queue.Queue,
+    batch_size: Union[int, Callable[[], int]],
+    is_running: Callable[[], bool],
+    should_flush: Optional[Callable[[], bool]] = None,
+) -> Iterator[List[Any]]:
+    """Groups the items from the queue into the batches of the specified size.
+    The last batch may be smaller than the batch size.
+
+    Args:
+        in_queue (queue.Queue): queue to read the items from
+        batch_size (Union[int, Callable[[], int]]): maximum number of items in the batch
+            or the function which returns it, if the batch size is changed on the fly
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+        should_flush (Optional[Callable[[], bool]]): returns True if the incomplete
+            batch should be yielded, e.g. when the previous stage waits for the resources
+            held by the items of the batch
+
+    Raises:
+        StageError: if the stage which puts the items has stopped with error
+
+    Yields:
+        Iterator[List[Any]]: batches of items from the queue
+    """
+    get_batch_size = batch_size if callable(batch_size) else lambda: batch_size
+    batch = []
+    while True:
+        try:
+            item = in_queue.get(timeout=QUEUE_TIMEOUT)
+        except queue.Empty:
+            if not is_running():
+                break
+            if batch and should_flush and should_flush():
+                yield batch
+                batch = []
+            continue
+        if item is SENTINEL:
+            break
+        if isinstance(item, StageError):
+            raise item
+        batch.append(item)
+        if len(batch) >= get_batch_size():
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def produce(
+    items: Iterable[Any], out_queue: queue.Queue, is_running: Callable[[], bool]
+) -> threading.Thread:
+    """Starts the thread which puts the items from the iterable into the queue.
+
+    Args:
+        items (Iterable[Any]): iterable with items, e.g. generator of search results
+        out_queue (queue.Queue): queue to put the items into
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+    Returns:
+        threading.Thread: started thread of the stage
+    """
+
+    def worker():
+        end = SENTINEL
+        try:
+            for item in items:
+                if not put(out_queue, item, is_running):
+                    break
+        except Exception as error:
+            end = get_end_marker(error)
+        finally:
+            put(out_queue, end, is_running)
+
+    return _start(worker)
+
+
+def merge(
+    iterables: List[Iterable[Any]], is_running: Callable[[], bool]
+) -> Iterator[Any]:
+    """Iterates over the iterables concurrently, each one in its own thread,
+    and yields their items in the order they are produced.
+
+    Args:
+        iterables (List[Iterable[Any]]): iterables with items, e.g. generators of search results
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+    Yields:
+        Iterator[Any]: items from all iterables
+    """
+    merged = queue.Queue(maxsize=len(iterables))
+    for items in iterables:
+        produce(items, merged, is_running)
+
+    # Each producer puts its own sentinel, so wait for all of them.
+    for _ in iterables:
+        yield from iterate(merged, is_running)
+        if not is_running():
+            return
+
+
+def map_concurrently(
+    func: Callable[[Any], Any],
+    in_queue: queue.Queue,
+    out_queue: queue.Queue,
+    max_workers: int,
+    is_running: Callable[[], bool],
+    limiter: Optional[Limiter] = None,
+) -> threading.Thread:
+    """Starts the thread which applies the function to the items from the input queue
+    in the pool of workers and puts the results into the output queue. Results which
+    are None are not passed to the next stage. Number of items in flight is bounded
+    by the number of workers, so the memory usage does not depend on the input size.
+
+    Args:
+        func (Callable[[Any], Any]): function to apply to each item
+        in_queue (queue.Queue): queue to read the items from
+        out_queue (queue.Queue): queue to put the results into
+        max_workers (int): number of workers in the pool
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+        limiter (Optional[Limiter]): limiter of the items in flight, which allows
+            to change the concurrency on the fly up to max_workers
+
+    Returns:
+        threading.Thread: started thread of the stage
+    """
+    in_flight = limiter or Limiter(max_workers * 2)
+
+    def task(item: Any):
+        try:
+            # The queued items are skipped as soon as the pipeline is stopped.
+            if not is_running():
+                return
+            result = func(item)
+            if result is not None:
+                put(out_queue, result, is_running)
+        except Exception as error:
+            sly.logger.error(f"The pipeline task has failed with error: {error}.")
+        finally:
+            in_flight.release()
+
+    def worker():
+        end = SENTINEL
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                for item in iterate(in_queue, is_running):
+                    # Wait for a free slot before submitting the next item.
+                    if not in_flight.acquire(is_running):
+                        break
+                    executor.submit(task, item)
+        except Exception as error:
+            end = get_end_marker(error)
+        finally:
+            put(out_queue, end, is_running)
+
+    return _start(worker)
+
+
+def map_async(
+    func: Callable[[Any, Any], Awaitable[Any]],
+    in_queue: queue.Queue,
+    out_queue: queue.Queue,
+    concurrency: Union[int, Callable[[], int]],
+    is_running: Callable[[], bool],
+    context: Callable[[], AsyncContextManager[Any]],
+) -> threading.Thread:
+    """Starts the thread with the event loop which applies the coroutine function
+    to the items from the input queue and puts the results into the output queue.
+    Results which are None are not passed to the next stage. Unlike map_concurrently(),
+    the items in flight don't need a thread each, so hundreds of I/O bound items
+    can be processed at the same time.
+
+    Args:
+        func (Callable[[Any, Any], Awaitable[Any]]): coroutine function, which receives
+            the value of the context and the item
+        in_queue (queue.Queue): queue to read the items from
+        out_queue (queue.Queue): queue to put the results into
+        concurrency (Union[int, Callable[[], int]]): maximum number of items in flight
+            or the function which returns it, if the concurrency is changed on the fly
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+        context (Callable[[], AsyncContextManager[Any]]): factory of the async context
+            which is entered in the event loop for the whole stage, e.g. HTTP session
+
+    Returns:
+        threading.Thread: started thread of the stage
+    """
+    get_concurrency = concurrency if callable(concurrency) else lambda: concurrency
+
+    async def task(resource: Any, item: Any):
+        loop = asyncio.get_running_loop()
+        try:
+            result = await func(resource, item)
+            if result is not None:
+                # The queue is bounded, so waiting for the free place in the executor.
+                await loop.run_in_executor(None, put, out_queue, result, is_running)
+        except Exception as error:
+            sly.logger.error(f"The pipeline task has failed with error: {error}.")
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        items = iterate(in_queue, is_running)
+        in_flight = set()
+        async with context() as resource:
+            while is_running():
+                # Reading the thread-safe queue in the executor doesn't block the loop.
+                item = await loop.run_in_executor(None, next, items, SENTINEL)
+                if item is SENTINEL:
+                    break
+                # Wait for a free slot before starting the next item.
+                while in_flight and len(in_flight) >= get_concurrency():
+                    if not is_running():
+                        break
+                    await asyncio.wait(
+                        in_flight,
+                        timeout=QUEUE_TIMEOUT,
+                        return_when=asyncio.FIRST_COMPLETED,
+                    )
+                future = asyncio.ensure_future(task(resource, item))
+                in_flight.add(future)
+                future.add_done_callback(in_flight.discard)
+
+            if not is_running():
+                for future in in_flight:
+                    future.cancel()
+            if in_flight:
+                await asyncio.wait(in_flight)
+
+    def worker():
+        end = SENTINEL
+        try:
+            asyncio.run(run())
+        except Exception as error:
+            end = get_end_marker(error)
+        finally:
+            put(out_queue, end, is_running)
+
+    return _start(worker)
+
+
+def ordered_map(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: int,
+    is_running: Callable[[], bool],
+) -> Iterator[Any]:
+    """Applies the function to the items in the pool of workers and yields the results
+    in the order of the items. Only max_workers items are processed ahead of the one
+    which is yielded next, so the results are not accumulated in memory.
+
+    Args:
+        func (Callable[[Any], Any]): function to apply to each item
+        items (Iterable[Any]): items to process
+        max_workers (int): number of workers in the pool
+        is_running (Callable[[], bool]): returns False if the pipeline was stopped
+
+    Yields:
+        Iterator[Any]: results of the function in the order of the items
+    """
+    futures = deque()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        try:
+            for item in items:
+                if not is_running():
+                    return
+                futures.append(executor.submit(func, item))
+                if len(futures) >= max_workers:
+                    yield futures.popleft().result()
+            while futures and is_running():
+                yield futures.popleft().result()
+        finally:
+            # Cancel the tasks which were not started if the pipeline was stopped.
+            for future in futures:
+                future.cancel()
+
+
+def _start(target: Callable[[], None]) -> threading.Thread:
+    """Starts the daemon thread with the specified target.
+
+    Args:
+        target (Callable[[], None]): function to run in the thread
+
+    Returns:
+        threading.Thread: started thread
+    """
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
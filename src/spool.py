@@ -0,0 +1,201 @@
+import asyncio
+import os
+import threading
+
+from shutil import rmtree
+from typing import Dict, Optional
+
+import supervisely as sly
+
+import src.pipeline as pipeline
+
+
+class Spool:
+    """Temporary directory for the downloaded images with the limit of the total size
+    of the files. The space is reserved before the download and freed when the file
+    is removed, so downloads wait while the spool is full and continue after
+    the uploaded batch is removed.
+
+    The size of the image is known only from the response, but the space is reserved
+    before the request, so the downloads don't keep the connections open while waiting.
+    The space is reserved by the average size of the downloaded files and is corrected
+    when the actual size is known.
+
+    Args:
+        directory (str): path to the directory for the files
+        limit (int): maximum total size of the files in bytes
+        default_size (int): size to reserve before the first file is downloaded
+    """
+
+    def __init__(self, directory: str, limit: int, default_size: int):
+        self.directory = directory
+        self.limit = limit
+        self.default_size = default_size
+        self.used = 0
+        # Maximum reserved space during the job for the logs and the benchmarks.
+        self.peak_used = 0
+        # Reserved sizes of the files by their paths.
+        self.files: Dict[str, int] = {}
+        # Statistics of the downloaded files for estimating the size of the next one.
+        self.downloaded_size = 0
+        self.downloaded_number = 0
+        # Set when some download couldn't reserve the space, reset by the next reserve.
+        self.full = False
+        self.condition = threading.Condition()
+
+    def get_path(self, name: str) -> str:
+        """Returns the path to the file in the spool.
+
+        Args:
+            name (str): name of the file
+
+        Returns:
+            str: path to the file
+        """
+        return os.path.join(self.directory, name)
+
+    def estimate_size(self) -> int:
+        """Returns the expected size of the next file.
+
+        Returns:
+            int: average size of the downloaded files or the default size
+        """
+        if not self.downloaded_number:
+            return self.default_size
+        return self.downloaded_size // self.downloaded_number
+
+    def try_reserve(self, path: str, size: int) -> bool:
+        """Reserves the space for the file if it fits into the limit. The file which is
+        larger than the limit is allowed only into the empty spool.
+
+        Args:
+            path (str): path to the file
+            size (int): expected size of the file in bytes
+
+        Returns:
+            bool: True if the space was reserved, False if the spool is full
+        """
+        with self.condition:
+            if self.used and self.used + size > self.limit:
+                self.full = True
+                return False
+            self.files[path] = self.files.get(path, 0) + size
+            self.used += size
+            self.peak_used = max(self.peak_used, self.used)
+            self.full = False
+            return True
+
+    def reserve(
+        self,
+        path: str,
+        size: int,
+        cancel_token: Optional[pipeline.CancellationToken] = None,
+    ):
+        """Reserves the space for the file, waiting while the spool is full.
+
+        Args:
+            path (str): path to the file
+            size (int): expected size of the file in bytes
+            cancel_token (Optional[pipeline.CancellationToken]): interrupts the waiting
+                if the job is cancelled
+
+        Raises:
+            pipeline.Cancelled: if the job was cancelled while waiting
+        """
+        with self.condition:
+            while not self.try_reserve(path, size):
+                if cancel_token is not None:
+                    cancel_token.check()
+                self.condition.wait(pipeline.QUEUE_TIMEOUT)
+
+    async def reserve_async(
+        self,
+        path: str,
+        size: int,
+        cancel_token: Optional[pipeline.CancellationToken] = None,
+    ):
+        """Reserves the space for the file like reserve(), but waits without blocking
+        the event loop of the asyncio download engine.
+
+        Args:
+            path (str): path to the file
+            size (int): expected size of the file in bytes
+            cancel_token (Optional[pipeline.CancellationToken]): interrupts the waiting
+                if the job is cancelled
+
+        Raises:
+            pipeline.Cancelled: if the job was cancelled while waiting
+        """
+        while not self.try_reserve(path, size):
+            if cancel_token is not None:
+                cancel_token.check()
+            await asyncio.sleep(pipeline.QUEUE_TIMEOUT)
+
+    def resize(self, path: str, size: int, downloaded: bool = False):
+        """Updates the reserved space with the size announced by the server
+        or the actual size of the downloaded file.
+
+        Args:
+            path (str): path to the file
+            size (int): size of the file in bytes
+            downloaded (bool): True if the file is downloaded and the size is final
+        """
+        with self.condition:
+            self.used += size - self.files.get(path, 0)
+            self.peak_used = max(self.peak_used, self.used)
+            self.files[path] = size
+            if downloaded:
+                self.downloaded_size += size
+                self.downloaded_number += 1
+            self.condition.notify_all()
+
+    def remove(self, path: str):
+        """Deletes the file and frees its space.
+
+        Args:
+            path (str): path to the file
+        """
+        if os.path.exists(path):
+            os.remove(path)
+        with self.condition:
+            self.used -= self.files.pop(path, 0)
+            self.condition.notify_all()
+
+    def is_full(self) -> bool:
+        """Returns True if the downloads are waiting for the free space.
+
+        Returns:
+            bool: True if the last reservation didn't fit into the limit
+        """
+        return self.full
+
+    def clear(self):
+        """Deletes all files of the spool."""
+        rmtree(self.directory, ignore_errors=True)
+        with self.condition:
+            self.files.clear()
+            self.used = 0
+            self.full = False
+            self.condition.notify_all()
+
+
+def sweep(directory: str):
+    """Deletes the files left in the spool directory by the runs which crashed
+    before they could clean up. Must be called before the first job is started.
+
+    Args:
+        directory (str): path to the spool directory
+    """
+    if not os.path.isdir(directory):
+        return
+    files_number = files_size = 0
+    for entry in os.scandir(directory):
+        if entry.is_file():
+            files_size += entry.stat().st_size
+            os.remove(entry.path)
+            files_number += 1
+    if files_number:
+        sly.logger.info(
+            f"Removed {files_number} orphaned files ({files_size} bytes) "
+            f"from the directory {directory}."
+        )
@@ -0,0 +1,153 @@
+import threading
+import time
+
+from typing import Tuple
+
+import supervisely as sly
+
+import src.globals as g
+import src.pipeline as pipeline
+
+
+class AutoTuner:
+    """Adjusts the number of concurrent downloads and the upload batch size on the fly
+    from the throughput and the error rate measured during the job.
+
+    The number of workers is tuned by hill climbing: it keeps changing in the same
+    direction while the download throughput grows, turns back when the throughput drops
+    and is halved when too many downloads fail. The batch size follows the measured
+    upload rate, so one batch takes about g.AUTO_TUNE_BATCH_SECONDS to upload.
+
+    Args:
+        workers (int): initial number of concurrent downloads
+        batch_size (int): initial upload batch size
+        workers_bounds (Tuple[int, int]): minimum and maximum number of workers
+        batch_size_bounds (Tuple[int, int]): minimum and maximum batch size
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        workers_bounds: Tuple[int, int],
+        batch_size_bounds: Tuple[int, int],
+    ):
+        self.workers_bounds = workers_bounds
+        self.batch_size_bounds = batch_size_bounds
+        self.workers = clamp(workers, workers_bounds)
+        self.batch_size = clamp(batch_size, batch_size_bounds)
+        self.limiter = pipeline.Limiter(self.workers)
+        self.lock = threading.Lock()
+
+        # Statistics of the downloads in the current measurement window.
+        self.window_start = time.monotonic()
+        self.succeeded = 0
+        self.failed = 0
+        self.last_throughput = None
+        # Direction of the next change of the number of workers: 1 or -1.
+        self.direction = 1
+
+    @property
+    def max_workers(self) -> int:
+        """Maximum number of workers, which is the size of the download pool."""
+        return self.workers_bounds[1]
+
+    def get_batch_size(self) -> int:
+        """Returns the current upload batch size.
+
+        Returns:
+            int: batch size
+        """
+        return self.batch_size
+
+    def record_download(self, success: bool):
+        """Records the result of the download and adjusts the number of workers
+        after each measurement window.
+
+        Args:
+            success (bool): True if the image was downloaded successfully
+        """
+        with self.lock:
+            if success:
+                self.succeeded += 1
+            else:
+                self.failed += 1
+            elapsed = time.monotonic() - self.window_start
+            if elapsed >= g.AUTO_TUNE_INTERVAL:
+                self._tune_workers(elapsed)
+
+    def record_upload(self, images_number: int, seconds: float):
+        """Records the duration of the batch upload and adjusts the batch size.
+
+        Args:
+            images_number (int): number of images in the uploaded batch
+            seconds (float): duration of the upload
+        """
+        if not images_number or seconds <= 0:
+            return
+        rate = images_number / seconds
+        target = rate * g.AUTO_TUNE_BATCH_SECONDS
+        # Moving halfway to the target to smooth out the noise of single batches.
+        batch_size = clamp(
+            round((self.batch_size + target) / 2), self.batch_size_bounds
+        )
+        if batch_size != self.batch_size:
+            sly.logger.info(
+                f"Auto-tuning: upload rate is {rate:.1f} images/s, "
+                f"batch size is changed from {self.batch_size} to {batch_size}."
+            )
+            self.batch_size = batch_size
+
+    def _tune_workers(self, elapsed: float):
+        """Changes the number of workers according to the statistics of the window.
+
+        Args:
+            elapsed (float): duration of the window in seconds
+        """
+        total = self.succeeded + self.failed
+        throughput = self.succeeded / elapsed
+        error_rate = self.failed / total
+        step = max(1, self.workers // 4)
+
+        if error_rate > g.AUTO_TUNE_MAX_ERROR_RATE:
+            # The source is overloaded or throttles the requests, back off fast.
+            workers = self.workers // 2
+            self.direction = 1
+        elif self.last_throughput is None or throughput > self.last_throughput * (
+            1 + g.AUTO_TUNE_TOLERANCE
+        ):
+            # The last change helped, so keep going in the same direction.
+            workers = self.workers + self.direction * step
+        elif throughput < self.last_throughput * (1 - g.AUTO_TUNE_TOLERANCE):
+            # The last change made it worse, so turn back.
+            self.direction = -self.direction
+            workers = self.workers + self.direction * step
+        else:
+            workers = self.workers
+
+        workers = clamp(workers, self.workers_bounds)
+        if workers != self.workers:
+            sly.logger.info(
+                f"Auto-tuning: download throughput is {throughput:.1f} images/s with "
+                f"{error_rate:.0%} errors, workers number is changed from "
+                f"{self.workers} to {workers}."
+            )
+            self.workers = workers
+            self.limiter.set_limit(workers)
+
+        self.last_throughput = throughput
+        self.window_start = time.monotonic()
+        self.succeeded = self.failed = 0
+
+
+def clamp(value: int, bounds: Tuple[int, int]) -> int:
+    """Limits the value with the minimum and maximum bounds.
+
+    Args:
+        value (int): value to limit
+        bounds (Tuple[int, int]): minimum and maximum values
+
+    Returns:
+        int: limited value
+    """
+    return max(bounds[0], min(value, bounds[1]))
@@ -1,5 +1,3 @@
-import requests
-
 import supervisely as sly
 
 from supervisely.app.widgets import (
@@ -11,12 +9,17 @@ from supervisely.app.widgets import (
 )
 
 import src.ui.keys as keys
+import src.engine as engine
 import src.globals as g
+import src.pexels as pexels
 
 query_message = Text(status="error", text="Please, enter the search query.")
 query_message.hide()
 
-search_query_input = Input(minlength=1, placeholder="Enter the search query")
+search_query_input = Input(
+    minlength=1,
+    placeholder=f"Enter the search query or several queries separated by '{g.QUERY_SEPARATOR}'",
+)
 
 search_button = Button("Check number of images")
 
@@ -26,7 +29,8 @@ search_results.hide()
 # Main card for all input widgets.
 card = Card(
     title="2️⃣ Search query",
-    description="Please, enter the search query to find images on Pexels.",
+    description="Please, enter the search query to find images on Pexels. "
+    "Several queries are searched together and each image is uploaded only once.",
     content=Container(
         widgets=[
             search_query_input,
@@ -52,37 +56,55 @@ def get_number_of_results():
         f"Button was clicked. Search query: {search_query}, license: {license}."
     )
 
-    if search_query:
-        # Specifying request parameters and headers.
-        headers = {"Authorization": keys.pexels_api_key}
-        params = {"query": search_query}
-
-        # Making a request to the Pexels API.
-        response = requests.get(g.PEXELS_API_URL, headers=headers, params=params)
-        try:
-            # Getting the number of requests left fot the API key.
-            rate_remaining = int(response.headers["X-Ratelimit-Remaining"])
+    search_queries = engine.get_search_queries(search_query)
+    numbers_of_results = []
+    # Pexels API limits the number of results, so the real number may be bigger.
+    is_capped = False
+    for query in search_queries:
+        # Specifying request parameters, which are the same as for the first page
+        # of the search, so the cached response will be reused when uploading.
+        params = {"query": query, "per_page": g.IMAGES_PER_PAGE, "page": 1}
+
+        # Making a request to the Pexels API or reading the response from the cache.
+        response_data = pexels.search_page(keys.pexels_api_key, params)
+
+        # Getting the number of requests left for the API key.
+        rate_remaining = pexels.rate_limiter.remaining
+        if rate_remaining is not None:
             sly.logger.info(
                 f"Pexels API announced that {rate_remaining} requests left."
             )
-        except KeyError:
-            sly.logger.error(f"Headers not found in the response: {response.headers}.")
+
+        if response_data is None:
+            search_results.text = "Pexels API did not answer correctly, try again later."
+            search_results.status = "error"
+            search_results.show()
+            return
 
         # Getting the number of images found by the search query.
-        number_of_results = response.json().get("total_results")
+        number_of_results = response_data.get("total_results")
+        numbers_of_results.append(f"{query}: {number_of_results}")
+        is_capped = is_capped or number_of_results == g.MAX_SEARCH_RESULTS
 
         sly.logger.info(
-            f"Pexels API returned {number_of_results} images for the search query: {search_query}."
+            f"Pexels API returned {number_of_results} images for the search query: {query}."
         )
-        if number_of_results == 8000:
+
+    if search_queries:
+        search_results.status = "info"
+        if len(search_queries) == 1:
+            search_results.text = f"Number of images found: {number_of_results}."
+        else:
             search_results.text = (
-                "At least 8000 images were found. Pexels API "
-                "limits the number of search results to 8000, but it may be more."
+                f"Number of images found: {'; '.join(numbers_of_results)}."
+            )
+        if is_capped:
+            search_results.text += (
+                f" Pexels API limits the number of search results to {g.MAX_SEARCH_RESULTS}, "
+                "but it may be more. Use sharded search to get more images."
             )
-        else:
-            search_results.text = f"Number of images found: {number_of_results}."
         search_results.show()
 
-    if not search_query:
+    if not search_queries:
         # Showing the error message if the search query is empty.
         query_message.show()
@@ -8,6 +8,7 @@ import src.ui.output as output
 import src.ui.input as input
 import src.ui.settings as settings
 import src.globals as g
+import src.pexels as pexels
 
 
 key_input = Input(type="password")
@@ -44,14 +45,17 @@ def connect_to_api():
     if not pexels_api_key:
         pexels_api_key = key_input.get_value()
 
-    # Specifying request parameters and headers.
-    headers = {"Authorization": pexels_api_key}
+    # Specifying request parameters.
     params = {"query": "test"}
 
     # Making a request to the Pexels API.
-    response = requests.get(g.PEXELS_API_URL, headers=headers, params=params)
+    try:
+        response = pexels.search(pexels_api_key, params)
+    except requests.RequestException as error:
+        sly.logger.warning(f"The request to the Pexels API failed with error: {error}.")
+        response = None
 
-    if response.status_code == 200:
+    if response is not None and response.status_code == 200:
         # Checking the connection to the Pexels API with specified API key.
 
         sly.logger.info("The connection to the Pexels API was successful.")
@@ -59,9 +63,10 @@ def connect_to_api():
         # Resetting the global API key if the connection failed.
 
         pexels_api_key = None
-        sly.logger.warning(
-            f"The connection to the Pexels API failed with error: {response.json()}."
-        )
+        if response is not None:
+            sly.logger.warning(
+                f"The connection to the Pexels API failed with error: {response.text}."
+            )
         check_result.text = "The connection to the Pexels API failed, check the key."
         check_result.status = "error"
         check_result.show()
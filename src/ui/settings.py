@@ -17,13 +17,40 @@ import src.globals as g
 image_sizes = [
     Select.Item(value=size, label=size.capitalize()) for size in g.IMAGE_SIZES
 ]
+image_sizes.append(
+    Select.Item(value=g.TARGET_IMAGE_SIZE, label="Target size (resized by Pexels)")
+)
 image_size_select = Select(items=image_sizes)
 
+# Inputs for the maximum dimension and quality of the images resized by Pexels.
+target_dimension_text = Text("Maximum width and height of the image in pixels:")
+target_dimension_input = InputNumber(
+    value=g.DEFAULT_TARGET_DIMENSION, min=1, precision=0
+)
+target_quality_text = Text("JPEG quality of the image (from 1 to 100):")
+target_quality_input = InputNumber(
+    value=g.DEFAULT_TARGET_QUALITY, min=1, max=100, precision=0
+)
+target_size_container = Container(
+    widgets=[
+        target_dimension_text,
+        target_dimension_input,
+        target_quality_text,
+        target_quality_input,
+    ],
+    direction="vertical",
+)
+target_size_container.hide()
+
 # Field for choosing image size.
 image_size_field = Field(
     title="Image size",
-    description="Choose the size of the image to download.",
-    content=image_size_select,
+    description="Choose the size of the image to download. With the target size "
+    "the original images are resized and compressed by Pexels before downloading, "
+    "so only the needed bytes are transferred and stored.",
+    content=Container(
+        widgets=[image_size_select, target_size_container], direction="vertical"
+    ),
 )
 
 # Field for choosing starting number for searching images.
@@ -88,6 +115,43 @@ metadata_field = Field(
     ),
 )
 
+# Field for enabling skipping of near-duplicate images.
+near_duplicates_checkbox = Checkbox(content="Skip near-duplicate images")
+near_duplicates_field = Field(
+    title="Near-duplicates",
+    description="Compare perceptual hashes of downloaded images with the images in the "
+    "dataset and skip visually similar ones. Works only when copying source files.",
+    content=near_duplicates_checkbox,
+)
+
+# Field for enabling skipping of the images which exist in other projects.
+workspace_duplicates_checkbox = Checkbox(
+    content="Skip images which exist in the workspace"
+)
+workspace_duplicates_field = Field(
+    title="Workspace duplicates",
+    description="Skip the photos which were already uploaded by the app to any dataset "
+    "of the workspace, not only to the selected one.",
+    content=workspace_duplicates_checkbox,
+)
+
+# Field for choosing the search filters to split the search into shards.
+shard_filters_select = Select(
+    items=[
+        Select.Item(value=name, label=name.capitalize()) for name in g.SHARD_FILTERS
+    ],
+    multiple=True,
+    placeholder="Sharded search is disabled",
+)
+shard_filters_field = Field(
+    title="Sharded search",
+    description=f"Pexels API returns at most {g.MAX_SEARCH_RESULTS} results for one query. "
+    "Select the filters to split the query into sub-queries for each combination of "
+    "their values, which are searched in parallel and merged without duplicates. "
+    "The starting image number is not used with sharded search.",
+    content=shard_filters_select,
+)
+
 # Field for choosing number of images to find.
 images_number_input = InputNumber(value=1, min=1, precision=0)
 images_number_field = Field(
@@ -99,8 +163,31 @@ images_number_field = Field(
 # Inputs for changing default settings.
 batch_size_input = InputNumber(value=500, min=1, precision=0)
 max_workers_input = InputNumber(value=os.cpu_count(), min=1, precision=0)
+search_workers_input = InputNumber(value=g.SEARCH_WORKERS, min=1, precision=0)
 batch_size_input.disable()
 max_workers_input.disable()
+search_workers_input.disable()
+in_memory_checkbox = Checkbox(
+    content="Upload downloaded files from memory without saving them to disk"
+)
+in_memory_checkbox.disable()
+# Checkbox for tuning the number of workers and the batch size during the job.
+auto_tune_checkbox = Checkbox(
+    content="Tune the number of workers and the batch size automatically, "
+    "starting from the values above",
+)
+auto_tune_checkbox.disable()
+
+# Radio group for choosing the engine which downloads the images.
+download_engine_radio = RadioGroup(
+    items=[
+        RadioGroup.Item(value=engine, label=description)
+        for engine, description in g.DOWNLOAD_ENGINES.items()
+    ],
+    direction="vertical",
+)
+download_engine_radio.set_value(value=g.DEFAULT_DOWNLOAD_ENGINE)
+download_engine_radio.disable()
 
 # Checkbox for unlocking default settings inputs.
 default_settings_checkbox = Checkbox(content="Use default settings", checked=True)
@@ -110,6 +197,13 @@ batch_size_text = Text("Batch size for uploading images:")
 max_workers_text = Text(
     "Maximum number of workers for uploading image files in parallel:"
 )
+search_workers_text = Text(
+    "Number of search result pages to fetch in parallel (limited by the API rate):"
+)
+download_engine_text = Text(
+    "Engine for downloading image files (the asyncio engine ignores the number of "
+    f"workers and keeps up to {g.ASYNC_DOWNLOAD_CONCURRENCY} downloads in flight):"
+)
 
 # Field for choosing upload settings.
 upload_settings_field = Field(
@@ -122,6 +216,12 @@ upload_settings_field = Field(
             batch_size_input,
             max_workers_text,
             max_workers_input,
+            search_workers_text,
+            search_workers_input,
+            in_memory_checkbox,
+            download_engine_text,
+            download_engine_radio,
+            auto_tune_checkbox,
         ],
         direction="vertical",
     ),
@@ -134,8 +234,11 @@ card = Card(
             image_size_field,
             images_number_field,
             start_number_field,
+            shard_filters_field,
             metadata_field,
             upload_method_field,
+            near_duplicates_field,
+            workspace_duplicates_field,
             upload_settings_field,
         ],
         direction="vertical",
@@ -147,13 +250,33 @@ card = Card(
 card.lock()
 
 
+@image_size_select.value_changed
+def show_target_size(value):
+    if value == g.TARGET_IMAGE_SIZE:
+        target_size_container.show()
+    else:
+        target_size_container.hide()
+
+
 @default_settings_checkbox.value_changed
 def unlock_settings(checked):
     if checked:
         batch_size_input.value = 500
         max_workers_input.value = os.cpu_count()
+        search_workers_input.value = g.SEARCH_WORKERS
+        in_memory_checkbox.uncheck()
+        auto_tune_checkbox.uncheck()
+        download_engine_radio.set_value(value=g.DEFAULT_DOWNLOAD_ENGINE)
         batch_size_input.disable()
         max_workers_input.disable()
+        search_workers_input.disable()
+        in_memory_checkbox.disable()
+        auto_tune_checkbox.disable()
+        download_engine_radio.disable()
     else:
         batch_size_input.enable()
         max_workers_input.enable()
+        search_workers_input.enable()
+        in_memory_checkbox.enable()
+        auto_tune_checkbox.enable()
+        download_engine_radio.enable()
@@ -0,0 +1,85 @@
+import io
+import os
+
+from typing import Tuple, Union
+
+from PIL import Image
+
+# Signatures at the beginning of the files of the allowed image formats.
+MAGIC_BYTES = {
+    "JPEG": b"\xff\xd8\xff",
+    "PNG": b"\x89PNG\r\n\x1a\n",
+}
+# Formats of the images by the extensions from the links.
+FORMATS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG"}
+HEADER_SIZE = max(len(magic) for magic in MAGIC_BYTES.values())
+
+# Reasons of rejecting the images for the metrics and the log.
+BAD_MAGIC = "bad_magic"
+BAD_HEADER = "bad_header"
+FORMAT_MISMATCH = "format_mismatch"
+BAD_DIMENSIONS = "bad_dimensions"
+
+
+class ValidationError(Exception):
+    """Raised if the downloaded file is not a valid image.
+
+    Args:
+        reason (str): short reason of rejecting the image, e.g. BAD_MAGIC
+        message (str): description of the problem
+    """
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+def validate_image(name: str, source: Union[str, bytes]) -> Tuple[str, int, int]:
+    """Checks that the downloaded file is an image of the format expected from its name.
+    Only the signature and the header of the image are read, the pixels are not decoded,
+    so the check is much cheaper than the download itself.
+
+    Args:
+        name (str): name of the image with the extension
+        source (Union[str, bytes]): path to the image file or its content
+
+    Raises:
+        ValidationError: if the file is not a valid image
+
+    Returns:
+        Tuple[str, int, int]: format, width and height of the image
+    """
+    expected_format = FORMATS.get(os.path.splitext(name)[1].lower())
+
+    if isinstance(source, bytes):
+        header = source[:HEADER_SIZE]
+        source = io.BytesIO(source)
+    else:
+        with open(source, "rb") as f:
+            header = f.read(HEADER_SIZE)
+
+    # HTML error pages and other payloads are rejected without parsing.
+    if not any(header.startswith(magic) for magic in MAGIC_BYTES.values()):
+        raise ValidationError(
+            BAD_MAGIC, f"File {name} has unknown signature {header!r}."
+        )
+
+    try:
+        # Opening the image parses the header up to the image data.
+        with Image.open(source) as image:
+            image_format = image.format
+            width, height = image.size
+    except Exception as error:
+        raise ValidationError(
+            BAD_HEADER, f"Header of {name} can't be decoded: {error}."
+        )
+
+    if expected_format and image_format != expected_format:
+        raise ValidationError(
+            FORMAT_MISMATCH, f"File {name} is {image_format}, not {expected_format}."
+        )
+    if width <= 0 or height <= 0:
+        raise ValidationError(
+            BAD_DIMENSIONS, f"Image {name} has invalid size {width}x{height}."
+        )
+    return image_format, width, height